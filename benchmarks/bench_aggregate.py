@@ -0,0 +1,65 @@
+"""
+Study aggregation benchmark.
+
+Simulates a study's worth of sessions with bench_sessions.py, builds the
+study dataset from scratch (h008b/aggregate.py), then adds sessions one at
+a time and times each incremental re-aggregation -- what the runner does
+at the end of every session.
+
+Usage (from the repository root):
+    python benchmarks/bench_aggregate.py
+    python benchmarks/bench_aggregate.py --sessions 1000 --new-sessions 20
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_sessions
+from h008b.aggregate import aggregate, describe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sessions", type=int, default=300, help="sessions already collected (default 300)")
+    parser.add_argument("--new-sessions", type=int, default=10,
+                        help="sessions added one at a time afterwards (default 10)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="h008b_agg_bench_") as tmp:
+        data_dir, staged = os.path.join(tmp, "data"), os.path.join(tmp, "staged")
+        total = args.sessions + args.new_sessions
+        print(f"Simulating {total} sessions...")
+        bench_sessions.main(["--sessions", str(total), "--data-dir", staged, "--no-fsync",
+                             "--seed", str(args.seed)])
+        files = sorted(f for f in os.listdir(staged) if f.startswith("H008b_output_data_"))
+        os.makedirs(data_dir)
+        for name in files[:args.sessions]:
+            shutil.move(os.path.join(staged, name), data_dir)
+
+        t0 = perf_counter()
+        report = aggregate(data_dir)
+        full = perf_counter() - t0
+        print(f"\nFull build     : {full:.3f} s  ({describe(report)})")
+
+        timings = []
+        for name in files[args.sessions:]:
+            shutil.move(os.path.join(staged, name), data_dir)
+            t0 = perf_counter()
+            aggregate(data_dir)
+            timings.append(perf_counter() - t0)
+        if timings:
+            timings.sort()
+            print(f"Incremental    : {len(timings)} sessions added, "
+                  f"median {timings[len(timings) // 2]:.3f} s, max {timings[-1]:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
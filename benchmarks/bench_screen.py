@@ -0,0 +1,84 @@
+"""
+Screen redraw benchmark.
+
+Times the runner's question screen drawn with h008b/screen.py -- a full
+frame, and a retry where only the points and prompt change -- against the
+old os.system('clear') + print() redraw. Output goes to an in-memory
+buffer (and the shell's to /dev/null), so this measures the cost of
+producing a redraw, not of the terminal displaying it.
+
+Usage (from the repository root):
+    python benchmarks/bench_screen.py
+    python benchmarks/bench_screen.py --repeat 5000 --spawn-repeat 50
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from h008b.screen import Screen
+from h008b.questions import dict_of_question_info
+
+
+def question_frame(screen, points, question, prompt):
+    return [" Question 3/6",
+            screen.center("╭──────────────────────────────────────────────╮"),
+            screen.center("│            Problem-Solving Experiment        │"),
+            screen.center("╰──────────────────────────────────────────────╯"),
+            screen.center(f"Earned points: {points}"), "", "",
+            "", "Please provide a solution to the following problem:", "",
+            question, screen.divider(), "", prompt]
+
+
+def timed(fn, repeat):
+    t0 = perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (perf_counter() - t0) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--repeat", type=int, default=2000, help="in-process redraws to time (default 2000)")
+    parser.add_argument("--spawn-repeat", type=int, default=20,
+                        help="os.system('clear') redraws to time (default 20; 0 to skip)")
+    args = parser.parse_args(argv)
+
+    question = next(iter(dict_of_question_info.values()))["insight_question"]
+    buffer = io.StringIO()
+    screen = Screen(buffer, ansi=True, size=(100, 50))
+
+    def full(i):
+        screen.clear()
+        screen.render(question_frame(screen, i, question, "Enter your solution: "))
+        buffer.seek(0)
+        buffer.truncate()
+
+    def retry(i):
+        screen.render(question_frame(screen, i % 7 * 10, question, f"Hint number {i % 3}.\nTry again: "))
+        buffer.seek(0)
+        buffer.truncate()
+
+    print(f"Screen, full frame   : {timed(full, args.repeat) * 1e6:8.1f} us")
+    screen.clear()
+    print(f"Screen, retry redraw : {timed(retry, args.repeat) * 1e6:8.1f} us")
+
+    if args.spawn_repeat and shutil.which("clear"):
+        def spawn(i):
+            subprocess.run(["clear"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            columns = shutil.get_terminal_size().columns
+            buffer.write("\n".join(" " * ((columns - len(line)) // 2) + line
+                                   for line in question_frame(screen, i, question, "")))
+            buffer.seek(0)
+            buffer.truncate()
+        print(f"os.system('clear')   : {timed(spawn, args.spawn_repeat) * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
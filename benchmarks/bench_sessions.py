@@ -0,0 +1,235 @@
+"""
+Headless session benchmark for the H008b runner.
+
+Replays scripted participants against h008b.engine.Session -- the same trial
+loop the terminal runner drives -- with a local stub grader in place of
+OpenAI, so it runs on an offline machine. Each simulated participant works
+through their question bank with a mix of wrong answers, passes, correct
+answers + surveys, and some sessions hit the session timer part-way through.
+
+Reports
+    - per-response grading latency percentiles (submit_response round trip)
+    - time spent in data-file I/O (row writes, checkpoints, close)
+    - end-to-end session throughput
+
+Usage (from the repository root):
+    python benchmarks/bench_sessions.py
+    python benchmarks/bench_sessions.py --sessions 500 --concurrency 16 \\
+        --latency lognormal:-1.5,0.6 --local-grading --json results.json
+
+Latency distributions for the stub grader (seconds):
+    fixed:0.2   uniform:0.05,0.4   lognormal:MU,SIGMA   (exp(N(MU, SIGMA)))
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from h008b import (Session, GradingWorker, ResponseGrader, LocalGrader, GradingCache,
+                   SessionDataWriter, DATA_HEADER, build_grading_prompt,
+                   dict_of_question_info, dict_of_question_banks,
+                   dict_of_local_grading_rules)
+from h008b.local_grading import split_listed_answers, normalize_response
+from h008b.mock_server import parse_latency
+
+
+class StubEvaluator:
+    """Offline stand-in for OpenAIEvaluator.
+
+    Says "yes" to the question's listed correct answers and gives a generic
+    hint + grade otherwise, after sleeping for a sampled latency.
+    """
+
+    def __init__(self, latency_sampler, seed=0):
+        self.latency_sampler = latency_sampler
+        self._rng = Random(seed)
+        self._lock = threading.Lock()
+        self._answers_by_prompt = {}
+        for info in dict_of_question_info.values():
+            answers = {normalize_response(a) for a in split_listed_answers(info["insight_answer"])}
+            self._answers_by_prompt[build_grading_prompt(info)] = answers
+
+    def __call__(self, prompt, user_solution):
+        with self._lock:
+            latency = max(0.0, self.latency_sampler(self._rng))
+            grade = self._rng.randint(1, 4)
+        sleep(latency)
+        if normalize_response(user_solution) in self._answers_by_prompt.get(prompt, ()):
+            return "yes"
+        return f"That answer doesn't quite solve the problem, think about it differently. {grade}"
+
+
+class TimedDataWriter(SessionDataWriter):
+    """SessionDataWriter that adds up the time spent in file I/O."""
+
+    io_seconds = 0.0
+    _io_lock = threading.Lock()
+
+    def _timed(self, fn, *args):
+        t0 = perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with TimedDataWriter._io_lock:
+                TimedDataWriter.io_seconds += perf_counter() - t0
+
+    def write_row(self, row):
+        return self._timed(super().write_row, row)
+
+    def checkpoint(self):
+        return self._timed(super().checkpoint)
+
+    def close(self):
+        return self._timed(super().close)
+
+
+def participant_script(bank, rng, timeout_rate):
+    """Scripted behaviour for one participant: question -> list of actions.
+
+    Actions are ("wrong", text), ("pass",) or ("correct", text). Also
+    returns after how many solved questions the session timer should run
+    out (None for sessions that finish normally).
+    """
+    script = {}
+    for question in bank:
+        info = dict_of_question_info[question]
+        correct = split_listed_answers(info["insight_answer"])[0]
+        wrong = split_listed_answers(info["possible_incorrect_solution"]) or ["I am not sure"]
+        actions = [("wrong", rng.choice(wrong + ["no idea", "something else entirely"]))
+                   for _ in range(rng.choice([0, 0, 1, 1, 2, 3]))]
+        actions.append(("pass",) if rng.random() < 0.15 else ("correct", correct))
+        script[question] = actions
+    timeout_after = rng.randint(1, len(bank)) if rng.random() < timeout_rate else None
+    return script, timeout_after
+
+
+def run_session(session_id, args, worker, data_dir, latencies, lat_lock):
+    rng = Random(args.seed * 100003 + session_id)
+    bank_num = str(rng.randint(1, len(dict_of_question_banks)))
+    writer = TimedDataWriter(os.path.join(data_dir, f"H008b_output_data_sim{session_id:06d}.csv"),
+                             DATA_HEADER, sync=not args.no_fsync)
+    session = Session(f"SIM{session_id:06d}", rng.choice("AB"), bank_num, worker,
+                      data_writer=writer, rng=rng)
+    script, timeout_after = participant_script(dict_of_question_banks[bank_num], rng,
+                                               args.timeout_rate)
+    attempts = {q: 0 for q in script}
+    answered = 0
+    local_latencies = []
+    while session.next_question() is not None:
+        question = session.question_shorthand
+        actions = script[question]
+        for action in actions[attempts[question]:]:
+            attempts[question] += 1
+            if action[0] == "pass":
+                session.pass_question()
+                # Comes back later; answer it correctly the second time
+                script[question] = actions + [("correct", split_listed_answers(
+                    dict_of_question_info[question]["insight_answer"])[0])]
+                break
+            t0 = perf_counter()
+            outcome = session.submit_response(action[1])
+            local_latencies.append(perf_counter() - t0)
+            if outcome.accuracy == "Correct":
+                session.record_survey(rng.randint(1, 5), rng.randint(1, 5))
+                answered += 1
+                break
+        if timeout_after is not None and answered >= timeout_after:
+            session.deadline_ns = 0 # Force the TimerElapsed path
+    session.close()
+    with lat_lock:
+        latencies.extend(local_latencies)
+    return timeout_after is not None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sessions", type=int, default=200, help="simulated sessions (default 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions run at once (default 8)")
+    parser.add_argument("--latency", type=parse_latency, default=parse_latency("fixed:0"),
+                        metavar="SPEC", help="stub grader latency, e.g. uniform:0.05,0.4")
+    parser.add_argument("--timeout-rate", type=float, default=0.1,
+                        help="fraction of sessions that run out of time (default 0.1)")
+    parser.add_argument("--local-grading", action="store_true", help="enable the local matcher")
+    parser.add_argument("--cache", action="store_true", help="enable the SQLite grading cache")
+    parser.add_argument("--no-fsync", action="store_true", help="flush but don't fsync data files")
+    parser.add_argument("--data-dir", help="where to write session files (default: temp dir)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this .json file")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    data_dir = args.data_dir
+    if data_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="h008b_bench_")
+        data_dir = tmp.name
+    os.makedirs(data_dir, exist_ok=True)
+
+    local_grader = None
+    if args.local_grading:
+        local_grader = LocalGrader(dict_of_question_info, dict_of_local_grading_rules)
+    cache = GradingCache(os.path.join(data_dir, "bench_cache.sqlite")) if args.cache else None
+    grader = ResponseGrader(StubEvaluator(args.latency, args.seed), "stub",
+                            local_grader=local_grader, cache=cache)
+    # One shared grading pool, like a server hosting many stations would use
+    worker = GradingWorker(grader, background=True, max_workers=args.concurrency)
+
+    latencies, lat_lock = [], threading.Lock()
+    TimedDataWriter.io_seconds = 0.0
+    t0 = perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run_session, i, args, worker, data_dir, latencies, lat_lock)
+                   for i in range(args.sessions)]
+        timed_out = sum(f.result() for f in futures)
+    wall = perf_counter() - t0
+    worker.shutdown()
+    if cache is not None:
+        cache.close()
+
+    latencies.sort()
+    results = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "timed_out_sessions": timed_out,
+        "responses": len(latencies),
+        "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 3) for p in (50, 90, 95, 99)},
+        "latency_ms_max": round(latencies[-1] * 1000, 3) if latencies else None,
+        "csv_io_seconds": round(TimedDataWriter.io_seconds, 4),
+        "wall_seconds": round(wall, 3),
+        "sessions_per_second": round(args.sessions / wall, 2),
+        "responses_per_second": round(len(latencies) / wall, 2),
+        }
+
+    print(f"Sessions       : {args.sessions} ({timed_out} hit the session timer), concurrency {args.concurrency}")
+    print(f"Responses      : {len(latencies)}")
+    print("Latency (ms)   : " + "  ".join(f"{k}={v}" for k, v in results["latency_ms"].items())
+          + f"  max={results['latency_ms_max']}")
+    print(f"CSV I/O        : {results['csv_io_seconds']} s total")
+    print(f"Wall time      : {results['wall_seconds']} s")
+    print(f"Throughput     : {results['sessions_per_second']} sessions/s, "
+          f"{results['responses_per_second']} responses/s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if tmp is not None:
+        tmp.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    main()
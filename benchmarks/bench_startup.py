@@ -0,0 +1,82 @@
+"""
+Runner startup benchmark.
+
+Launches H008b_Caffeine_and_Insight_ExpProgram.py with its output piped and
+times how long it takes for the experimenter setup screen's first prompt
+to appear, then kills it. For comparison it also times a bare interpreter
+and, when openai is installed, importing openai and building an OpenAI()
+client, which the runner now does on a background thread (see
+h008b/warmup.py) instead of before the setup screen.
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNNER = os.path.join(ROOT, "H008b_Caffeine_and_Insight_ExpProgram.py")
+MARKER = b"Input subject ID"
+
+
+def time_to_setup(env):
+    """Seconds from launch to the subject ID prompt (None if it never came)."""
+    started = perf_counter()
+    proc = subprocess.Popen([sys.executable, RUNNER], cwd=ROOT, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    seen = b""
+    try:
+        while MARKER not in seen:
+            chunk = proc.stdout.read1(4096)
+            if not chunk:
+                sys.stderr.write(seen.decode(errors="replace")[-2000:])
+                return None
+            seen += chunk
+        return perf_counter() - started
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def time_command(code, env):
+    started = perf_counter()
+    done = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return perf_counter() - started if done.returncode == 0 else None
+
+
+def report(label, times):
+    times = [t for t in times if t is not None]
+    if not times:
+        print(f"{label:<32}: failed")
+        return
+    print(f"{label:<32}: median {median(times) * 1000:7.1f} ms, "
+          f"min {min(times) * 1000:7.1f} ms ({len(times)} runs)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--repeat", type=int, default=10, help="launches to time (default 10)")
+    args = parser.parse_args(argv)
+    env = dict(os.environ, PYTHONUNBUFFERED="1", TERM="dumb")
+    env.setdefault("OPENAI_API_KEY", "bench-startup") # OpenAI() refuses to build without one
+
+    report("python -c pass", [time_command("pass", env) for _ in range(args.repeat)])
+    report("runner -> setup prompt", [time_to_setup(env) for _ in range(args.repeat)])
+    openai_times = [time_command("from openai import OpenAI; OpenAI()", env)
+                    for _ in range(args.repeat)]
+    if any(t is not None for t in openai_times):
+        report("python -c 'import openai; OpenAI()'", openai_times)
+    else:
+        print("openai isn't installed; skipping the import/client timing")
+
+
+if __name__ == "__main__":
+    main()
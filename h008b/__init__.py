@@ -0,0 +1,32 @@
+"""
+# H008b helper package
+# Created by Lina Z., Katrina B., and Cyrus K.
+
+Support code for the H008b experiment runner
+(H008b_Caffeine_and_Insight_ExpProgram.py). The runner script holds the
+participant-facing terminal flow; the modules in here hold the question
+dictionaries, the session engine and the grading pipeline, so they can be
+imported without starting a session.
+"""
+
+from h008b.questions import (dict_of_question_info, dict_of_question_banks,
+                             dict_of_local_grading_rules, QuestionCatalog,
+                             CatalogError, load_catalog)
+from h008b.data_writer import SessionDataWriter, ListDataWriter, DataSink
+from h008b.columnar import ColumnarSessionWriter, TeeDataWriter
+from h008b.screen import Screen
+from h008b.journal import SessionJournal, JournalError
+from h008b.warmup import LazyClient, ClientUnavailable
+from h008b.connection_pool import ConnectionPool
+from h008b.async_grading import GradingWorker, GradingJob
+from h008b.local_grading import LocalGrader, normalize_response
+from h008b.grading_cache import GradingCache
+from h008b.grading import (ResponseGrader, OpenAIEvaluator, PromptCatalog,
+                           build_grading_prompt, prompt_catalog, REVIEW_EVALUATION)
+from h008b.ordering import BankOrders, OrderingError, bank_orders
+from h008b.engine import Session, SessionError, ResponseOutcome, DATA_HEADER
+from h008b.batching import BatchingEvaluator, GradingDeadlineExceeded
+from h008b.structured_grading import StructuredEvaluator, MalformedEvaluation
+from h008b.resilience import ResilientEvaluator, CircuitBreaker, GradingUnavailable
+from h008b.speculative import SpeculativeGrader
+from h008b.routing import RoutingEvaluator, RouteRecord, MODEL_PRICES
@@ -0,0 +1,343 @@
+"""
+Study-wide dataset built from the per-session data files.
+
+Every session writes its own data/H008b_output_data_*.csv (H008a wrote
+data/H008a_output_data_*.csv with the first 13 columns only). This merges
+them into one study dataset and a per-subject A/B/A summary:
+
+    - Each file's header is checked against DATA_HEADER (older H008b files
+      are a prefix of it, H008a files the first 13 columns); files that
+      don't match are reported and left out. Rows with the wrong number of
+      fields (e.g. a torn last line) are dropped and counted.
+    - A manifest of SHA-256 hashes records what has been merged, so a rerun
+      only parses new or changed files and drops rows of deleted ones; the
+      rest of the dataset is reloaded as-is. Rerunning after each session
+      stays well under a second (see benchmarks/bench_aggregate.py).
+    - Sessions are put in order per subject (by the timestamp in the file
+      name) and numbered into phases by runs of ABA_Condition: A1, B1, A2...
+      The summary has one row per subject and phase: solve rate,
+      time-to-solve, attempts, points and survey means.
+
+Usage (from the repository root):
+    python -m h008b.aggregate                    # data/ -> data/study/
+    python -m h008b.aggregate --rebuild          # ignore the manifest
+
+Output (in --out, default DATA_FOLDER/study):
+    study_manifest.json   hash, row counts and status of every merged file
+    study_trials.csv      every row of every valid file, indexed by File + Row,
+                          with Study, SessionStart and Phase columns added
+    study_summary.csv     per-subject, per-phase summary (SUMMARY_HEADER)
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import re
+from statistics import median
+from time import perf_counter
+
+from h008b.columnar import parse_timedelta
+from h008b.engine import DATA_HEADER
+from h008b.regrade import DEFAULT_PATTERNS, study_of
+
+H008A_COLUMNS = DATA_HEADER.index("IRITimer") + 1   # H008a files stop here
+H008B_COLUMNS = DATA_HEADER.index("QuestionBankNum") + 1 # Subject/condition/bank
+STUDY_COLUMNS = ["File", "Study", "Row", "SessionStart", "Phase"] + DATA_HEADER
+SUMMARY_HEADER = ["Subject_ID", "Phase", "ABA_Condition", "Sessions", "Questions",
+                  "Solved", "SolveRate", "MeanTimeToSolve", "MedianTimeToSolve",
+                  "Responses", "MeanAttemptsToSolve", "Passes", "Points",
+                  "MeanPointsPerSession", "MeanTrialAndErrorSurvey", "MeanAhaSurvey"]
+MANIFEST_VERSION = 1
+
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}")
+_COL = {name: i for i, name in enumerate(STUDY_COLUMNS)}
+
+
+class SchemaError(ValueError):
+    """A data file whose header doesn't match DATA_HEADER."""
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_header(study, header):
+    if len(header) < H008A_COLUMNS or header != DATA_HEADER[:len(header)]:
+        raise SchemaError(f"header doesn't match DATA_HEADER: {header[:H008A_COLUMNS + 3]}...")
+    if study == "H008b" and len(header) < H008B_COLUMNS:
+        raise SchemaError("no Subject_ID/ABA_Condition/QuestionBankNum columns")
+
+
+def session_start(file_name):
+    """'YYYY-MM-DD_HH-MM-SS' from the file name, or 'NA'."""
+    match = _TIMESTAMP.search(file_name)
+    return match.group(0) if match else "NA"
+
+
+def read_session_file(path):
+    """(study rows, number of dropped rows); raises SchemaError."""
+    name, study = os.path.basename(path), study_of(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise SchemaError("empty file")
+        check_header(study, header)
+        prefix = [name, study, None, session_start(name), "NA"]
+        padding = ["NA"] * (len(DATA_HEADER) - len(header))
+        rows, dropped = [], 0
+        for number, row in enumerate(reader, start=1):
+            if len(row) != len(header):
+                dropped += 1
+                continue
+            prefix[2] = str(number)
+            rows.append(prefix + row + padding)
+    return rows, dropped
+
+
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _number(value, kind=float):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _round(value, digits=3):
+    return "NA" if value is None else round(value, digits)
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None # statistics.mean is ~50x slower
+
+
+class StudyDataset:
+    """The merged dataset in `out`, updated file by file against its manifest."""
+
+    def __init__(self, out):
+        self.out = out
+        self.manifest_path = os.path.join(out, "study_manifest.json")
+        self.trials_path = os.path.join(out, "study_trials.csv")
+        self.summary_path = os.path.join(out, "study_summary.csv")
+        self.files = {}  # file name -> manifest entry
+        self.rows = {}   # file name -> study rows
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        # A new DATA_HEADER changes every row; start over
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("columns") != STUDY_COLUMNS:
+            return
+        try:
+            with open(self.trials_path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                if next(reader, None) != STUDY_COLUMNS:
+                    return
+                for row in reader:
+                    self.rows.setdefault(row[0], []).append(row)
+        except OSError:
+            self.rows = {}
+            return
+        self.files = manifest["files"]
+        # Files whose rows went missing from the dataset get merged again
+        for name, entry in list(self.files.items()):
+            if entry["status"] == "ok" and len(self.rows.get(name, ())) != entry["rows"]:
+                del self.files[name]
+                self.rows.pop(name, None)
+
+    def update(self, paths):
+        """Merge new/changed files, drop deleted ones; returns a report dict."""
+        report = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "invalid": {}}
+        seen = set()
+        for path in paths:
+            name = os.path.basename(path)
+            seen.add(name)
+            digest = file_hash(path)
+            entry = self.files.get(name)
+            if entry is not None and entry["sha256"] == digest:
+                report["unchanged"] += 1
+                if entry["status"] != "ok":
+                    report["invalid"][name] = entry["error"]
+                continue
+            report["added" if entry is None else "changed"] += 1
+            self.rows.pop(name, None)
+            try:
+                rows, dropped = read_session_file(path)
+            except (SchemaError, csv.Error, UnicodeDecodeError) as e:
+                self.files[name] = {"sha256": digest, "status": "invalid", "error": str(e)}
+                report["invalid"][name] = str(e)
+                continue
+            self.rows[name] = rows
+            self.files[name] = {"sha256": digest, "status": "ok", "study": study_of(name),
+                                "rows": len(rows), "dropped_rows": dropped}
+        for name in set(self.files) - seen:
+            del self.files[name]
+            self.rows.pop(name, None)
+            report["removed"] += 1
+        return report
+
+    def sessions(self):
+        """File names in study order: by subject, then session start."""
+        def key(name):
+            rows = self.rows[name]
+            subject = rows[0][_COL["Subject_ID"]] if rows else "NA"
+            return (subject, session_start(name), name)
+        return sorted(self.rows, key=key)
+
+    def assign_phases(self):
+        """Number each subject's sessions into A1, B1, A2... by condition runs."""
+        subject_col, condition_col, phase_col = (_COL["Subject_ID"], _COL["ABA_Condition"],
+                                                 _COL["Phase"])
+        last = {} # subject -> (condition, phase)
+        runs = {} # (subject, condition) -> runs so far
+        for name in self.sessions():
+            rows = self.rows[name]
+            if not rows or rows[0][subject_col] in ("", "NA"):
+                continue # H008a files carry no subject/condition
+            subject, condition = rows[0][subject_col], rows[0][condition_col]
+            previous = last.get(subject)
+            if previous is not None and previous[0] == condition:
+                phase = previous[1]
+            else:
+                runs[subject, condition] = runs.get((subject, condition), 0) + 1
+                phase = f"{condition}{runs[subject, condition]}"
+            last[subject] = (condition, phase)
+            for row in rows:
+                row[phase_col] = phase
+
+    def summary(self):
+        """SUMMARY_HEADER rows, one per subject and phase."""
+        groups = {}
+        for name in self.sessions():
+            rows = self.rows[name]
+            if rows and rows[0][_COL["Phase"]] != "NA":
+                key = (rows[0][_COL["Subject_ID"]], rows[0][_COL["Phase"]])
+                groups.setdefault(key, []).append(rows)
+        return [self._summarize(subject, phase, sessions)
+                for (subject, phase), sessions in groups.items()]
+
+    @staticmethod
+    def _summarize(subject, phase, sessions):
+        c = _COL
+        questions = solved = responses = passes = 0
+        solve_times, attempts_to_solve, points, tae, aha = [], [], [], [], []
+        for rows in sessions:
+            attempts = {}
+            presented = set()
+            for row in rows:
+                accuracy, question = row[c["Accuracy"]], row[c["Question"]]
+                if accuracy in ("Correct", "Incorrect", "Review", "Pass"):
+                    presented.add(question)
+                if accuracy == "Pass":
+                    passes += 1
+                    continue
+                if accuracy not in ("Correct", "Incorrect", "Review"):
+                    continue
+                responses += 1
+                attempts[question] = attempts.get(question, 0) + 1
+                if accuracy == "Correct":
+                    solved += 1
+                    attempts_to_solve.append(attempts[question])
+                    try:
+                        solve_times.append(parse_timedelta(row[c["TrialTimer"]]).total_seconds())
+                    except ValueError:
+                        pass
+                    for col, values in (("TrialAndErrorSurveyResp", tae), ("AhaSurveyResp", aha)):
+                        value = _number(row[c[col]], int)
+                        if value is not None:
+                            values.append(value)
+            questions += len(presented)
+            final = [p for p in (_number(r[c["CumulativeEarnedPoints"]], int) for r in rows)
+                     if p is not None]
+            if final:
+                points.append(final[-1])
+        return [subject, phase, sessions[0][0][c["ABA_Condition"]], len(sessions), questions,
+                solved, _round(solved / questions if questions else None),
+                _round(_mean(solve_times)), _round(median(solve_times) if solve_times else None),
+                responses, _round(_mean(attempts_to_solve)), passes,
+                sum(points), _round(_mean(points), 1), _round(_mean(tae), 2), _round(_mean(aha), 2)]
+
+    def save(self):
+        """Write the dataset, summary and manifest (in that order)."""
+        os.makedirs(self.out, exist_ok=True)
+        self.assign_phases()
+        def write_trials(f):
+            w = csv.writer(f)
+            w.writerow(STUDY_COLUMNS)
+            for name in self.sessions():
+                w.writerows(self.rows[name])
+        def write_summary(f):
+            w = csv.writer(f)
+            w.writerow(SUMMARY_HEADER)
+            w.writerows(self.summary())
+        _write_atomic(self.trials_path, write_trials)
+        _write_atomic(self.summary_path, write_summary)
+        # Manifest last: if anything above fails, the next run redoes the work
+        _write_atomic(self.manifest_path, lambda f: f.write(json.dumps(
+            {"version": MANIFEST_VERSION, "columns": STUDY_COLUMNS, "files": self.files})))
+
+
+def discover(data_folder, patterns=None):
+    return sorted(p for pattern in (patterns or DEFAULT_PATTERNS)
+                  for p in glob.glob(os.path.join(data_folder, pattern)))
+
+
+def aggregate(data_folder, out=None, patterns=None, rebuild=False):
+    """Bring the study dataset in `out` up to date; returns the update report."""
+    started = perf_counter()
+    out = out or os.path.join(data_folder, "study")
+    if rebuild and os.path.exists(os.path.join(out, "study_manifest.json")):
+        os.remove(os.path.join(out, "study_manifest.json"))
+    dataset = StudyDataset(out)
+    report = dataset.update(discover(data_folder, patterns))
+    if (report["added"] or report["changed"] or report["removed"]
+            or not os.path.exists(dataset.summary_path)):
+        dataset.save()
+    report["files"] = len(dataset.rows)
+    report["seconds"] = round(perf_counter() - started, 3)
+    report["out"] = out
+    return report
+
+
+def describe(report):
+    return (f"{report['files']} file(s) in {report['out']}: {report['added']} new, "
+            f"{report['changed']} changed, {report['removed']} removed, "
+            f"{len(report['invalid'])} invalid ({report['seconds']:.2f}s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge H008a/H008b session files into a study dataset.")
+    parser.add_argument("--data-folder", default=os.path.join(os.getcwd(), "data"))
+    parser.add_argument("--pattern", action="append", default=None,
+                        help="file glob(s) in --data-folder (default: H008b and H008a output files)")
+    parser.add_argument("--out", default=None, help="output folder (default DATA_FOLDER/study)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="ignore the manifest and re-read every file")
+    args = parser.parse_args(argv)
+
+    report = aggregate(args.data_folder, args.out, args.pattern, args.rebuild)
+    for name, error in sorted(report["invalid"].items()):
+        print(f"  skipped {name}: {error}")
+    print(describe(report))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
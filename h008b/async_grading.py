@@ -0,0 +1,109 @@
+"""
+Background grading worker.
+
+The LLM round trip used to run on the main thread, so the participant (and
+the trial timers) sat through the whole network call. GradingWorker pushes
+the call onto a worker thread as soon as the participant hits enter; the
+runner keeps the screen alive while it waits and records the submission time
+separately from the time the grade came back.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from h008b.timing import now_ns, ns_seconds
+
+
+class GradingJob:
+    """One submitted response and its (eventual) grade."""
+
+    def __init__(self):
+        self.future = None
+        self.submitted_ns = now_ns() # perf_counter_ns() at submission
+        self.graded_ns = None        # perf_counter_ns() when the grade came back
+        self.latency = None          # seconds between the two
+
+    def _run(self, grade_fn, args, kwargs):
+        # Stamp the grade time on the worker thread, before the result is
+        # handed back, so it is always set once result() returns.
+        try:
+            return grade_fn(*args, **kwargs)
+        finally:
+            self._graded()
+
+    def _graded(self):
+        self.graded_ns = now_ns()
+        self.latency = ns_seconds(self.graded_ns - self.submitted_ns)
+
+    def waited(self):
+        """Seconds since submission (until the grade came back, once it has)."""
+        return ns_seconds((self.graded_ns or now_ns()) - self.submitted_ns, 1)
+
+    @classmethod
+    def follow(cls, source):
+        """A job timed from now that reports `source`'s grade.
+
+        Used to hand out a grade that was started earlier (a speculative
+        grade of a draft) without moving the trial timers to when it was
+        started. If `source` is already done, so is the new job (latency 0).
+        The source's stream and route records (if any) come along with it.
+        """
+        job = cls()
+        job.future = Future()
+        for name in ("stream", "route"):
+            if hasattr(source, name):
+                setattr(job, name, getattr(source, name))
+
+        def copy_result(future):
+            job._graded()
+            if future.cancelled():
+                job.future.cancel()
+            elif future.exception() is not None:
+                job.future.set_exception(future.exception())
+            else:
+                job.future.set_result(future.result())
+        source.future.add_done_callback(copy_result)
+        return job
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """Wait up to `timeout` seconds; returns True once the grade is in."""
+        wait([self.future], timeout=timeout)
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """Block until the grade is in (re-raises any grading error)."""
+        return self.future.result(timeout=timeout)
+
+
+class GradingWorker:
+    """Runs a grading function on background thread(s).
+
+    With background=False the grade is computed inline on submit(); the
+    returned job looks the same, so callers don't need two code paths.
+    """
+
+    def __init__(self, grade_fn, background=True, max_workers=1):
+        self.grade_fn = grade_fn
+        self.background = background
+        self._pool = None
+        if background:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="grader")
+
+    def submit(self, *args, **kwargs):
+        job = GradingJob()
+        if self._pool is not None:
+            job.future = self._pool.submit(job._run, self.grade_fn, args, kwargs)
+        else:
+            job.future = Future()
+            try:
+                job.future.set_result(job._run(self.grade_fn, args, kwargs))
+            except Exception as e:
+                job.future.set_exception(e)
+        return job
+
+    def shutdown(self, wait=False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
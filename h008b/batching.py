@@ -0,0 +1,151 @@
+"""
+Batched grading across concurrent sessions.
+
+When a room of participants submits at nearly the same moment, every grade
+is its own round trip carrying the same long per-question prompt.
+BatchingEvaluator sits in front of an evaluator (e.g. OpenAIEvaluator) and
+
+    - holds requests for a short window (default 50 ms) so near-simultaneous
+      ones can be coalesced,
+    - groups them by question prompt, and sends each group of 2+ answers as
+      one multi-answer request (evaluator.evaluate_many) so the prompt is
+      sent once; single answers are sent as usual,
+    - runs at most `max_concurrency` requests at a time, dispatching groups
+      in order of their oldest request so nobody is starved, and
+    - gives every request a deadline; a caller whose grade isn't back in
+      time gets GradingDeadlineExceeded instead of waiting forever.
+
+It has the same call signature as the evaluator it wraps, so it slots into
+ResponseGrader unchanged:
+
+    evaluator = BatchingEvaluator(OpenAIEvaluator(client, model))
+    grader = ResponseGrader(evaluator, model, local_grader, cache)
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from time import monotonic
+
+
+class GradingDeadlineExceeded(TimeoutError):
+    """A grade did not come back before its deadline."""
+
+
+class _PendingGrade:
+    __slots__ = ("prompt", "solution", "future", "arrived", "deadline")
+
+    def __init__(self, prompt, solution, deadline):
+        self.prompt = prompt
+        self.solution = solution
+        self.future = Future()
+        self.arrived = monotonic() # Not time(): a clock step mustn't move the window
+        self.deadline = self.arrived + deadline
+
+
+class BatchingEvaluator:
+    """Coalesces, groups and rate-bounds grading requests from many threads."""
+
+    def __init__(self, evaluator, window=0.05, max_batch=8, max_concurrency=8,
+                 deadline=60.0, multi_answer=True):
+        self.evaluator = evaluator
+        self.window = window
+        self.max_batch = max_batch
+        self.deadline = deadline
+        self.multi_answer = multi_answer and hasattr(evaluator, "evaluate_many")
+        self.stats = {"requests": 0, "batched_requests": 0, "batches": 0,
+                      "single_requests": 0, "batch_fallbacks": 0, "deadline_exceeded": 0}
+        self._pending = []
+        self._cv = threading.Condition()
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="grading-batch")
+        self._thread = threading.Thread(target=self._collect, name="grading-scheduler",
+                                        daemon=True)
+        self._thread.start()
+
+    def __call__(self, prompt, user_solution, deadline=None):
+        pending = _PendingGrade(prompt, user_solution,
+                                self.deadline if deadline is None else deadline)
+        with self._cv:
+            if self._closed:
+                raise RuntimeError("BatchingEvaluator is closed")
+            self._pending.append(pending)
+            self.stats["requests"] += 1
+            self._cv.notify()
+        try:
+            return pending.future.result(timeout=max(0.0, pending.deadline - monotonic()))
+        except FutureTimeout:
+            pending.future.cancel() # Skipped if it hasn't been sent yet
+            with self._cv:
+                self.stats["deadline_exceeded"] += 1
+            raise GradingDeadlineExceeded(
+                f"No grade within {pending.deadline - pending.arrived:.1f} s") from None
+
+    def _collect(self):
+        while True:
+            with self._cv:
+                while not self._pending and not self._closed:
+                    self._cv.wait()
+                if self._closed and not self._pending:
+                    return
+                # The window opens with the oldest waiting request
+                flush_at = self._pending[0].arrived + self.window
+                while not self._closed and monotonic() < flush_at:
+                    self._cv.wait(flush_at - monotonic())
+                batch, self._pending = self._pending, []
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        # Group by prompt, keeping groups in order of their oldest request
+        groups = OrderedDict()
+        for pending in batch:
+            groups.setdefault(pending.prompt, []).append(pending)
+        for prompt, items in groups.items():
+            for i in range(0, len(items), self.max_batch):
+                chunk = items[i:i + self.max_batch]
+                if self.multi_answer and len(chunk) > 1:
+                    self._pool.submit(self._run_batch, prompt, chunk)
+                else:
+                    for pending in chunk:
+                        self._pool.submit(self._run_single, pending)
+
+    def _run_single(self, pending):
+        if not pending.future.set_running_or_notify_cancel():
+            return # Caller already gave up
+        with self._cv:
+            self.stats["single_requests"] += 1
+        try:
+            pending.future.set_result(self.evaluator(pending.prompt, pending.solution))
+        except Exception as e:
+            pending.future.set_exception(e)
+
+    def _run_batch(self, prompt, chunk):
+        chunk = [p for p in chunk if p.future.set_running_or_notify_cancel()]
+        if not chunk:
+            return
+        with self._cv:
+            self.stats["batches"] += 1
+            self.stats["batched_requests"] += len(chunk)
+        try:
+            results = self.evaluator.evaluate_many(prompt, [p.solution for p in chunk])
+        except Exception:
+            results = [None] * len(chunk)
+        for pending, result in zip(chunk, results):
+            if result is None:
+                # Answer missing/garbled in the multi-answer reply; grade it alone
+                with self._cv:
+                    self.stats["batch_fallbacks"] += 1
+                try:
+                    result = self.evaluator(prompt, pending.solution)
+                except Exception as e:
+                    pending.future.set_exception(e)
+                    continue
+            pending.future.set_result(result)
+
+    def close(self):
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
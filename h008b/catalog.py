@@ -0,0 +1,93 @@
+"""
+Question catalog tool.
+
+Checks a question catalog (h008b/questions.json, or any file in its format;
+see h008b/questions.py) and prints what is in it: questions per type and
+difficulty, and how many valid question orders each bank has. It can also
+build a catalog from the dict_of_question_* literals of an older runner
+script (H008a, the PILOT), so its problems can be moved over without
+copying them by hand.
+
+Usage:
+    python -m h008b.catalog                          # check the catalog, print a summary
+    python -m h008b.catalog --check other.json
+    python -m h008b.catalog --import-script "H008b PILOT/H008b_Caffeine_and_Insight_ExpProgram_PILOT.py" --out pilot.json
+"""
+
+import argparse
+import ast
+import sys
+
+from h008b.ordering import OrderingError, bank_orders
+from h008b.questions import CatalogError, QuestionCatalog, load_catalog
+
+
+def script_literals(path, names):
+    """Module-level literal assignments `names` from a script, without running it."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    found = {}
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and getattr(node.targets[0], "id", None) in names):
+            found[node.targets[0].id] = ast.literal_eval(node.value)
+    return found
+
+
+def import_script(path):
+    """A catalog from the dict_of_question_* literals of an older runner script."""
+    found = script_literals(path, ("dict_of_question_info", "dict_of_question_banks",
+                                   "dict_of_local_grading_rules"))
+    if "dict_of_question_info" not in found:
+        raise CatalogError(f"No dict_of_question_info in {path}")
+    # Scripts without banks (H008a) get one bank holding every question
+    banks = found.get("dict_of_question_banks") or {"1": list(found["dict_of_question_info"])}
+    return QuestionCatalog(found["dict_of_question_info"], banks,
+                           found.get("dict_of_local_grading_rules"), path=path)
+
+
+def describe(catalog):
+    lines = [f"{len(catalog)} questions in {len(catalog.banks)} banks ({catalog.path})"]
+    for t, qs in sorted(catalog.by_type.items()):
+        lines.append(f"  {t:<14}: {len(qs)}")
+    if catalog.by_difficulty:
+        lines.append("  difficulty    : " + ", ".join(
+            f"{d}: {len(qs)}" for d, qs in sorted(catalog.by_difficulty.items(), key=str)))
+    for bank, qs in catalog.banks.items():
+        try:
+            orders = bank_orders(qs, catalog.questions)
+            count = f"{len(orders)} valid orders" if orders.exact else "too large to count orders"
+        except OrderingError as e:
+            count = f"CANNOT BE ORDERED: {e}"
+        lines.append(f"  bank {bank:<9}: {len(qs)} questions, {count}")
+    unbanked = len(catalog) - len(catalog.bank_of)
+    if unbanked:
+        lines.append(f"  not in a bank : {unbanked}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check or build an H008b question catalog")
+    parser.add_argument("--check", metavar="PATH", default=None,
+                        help="catalog to check (default: the one the experiment uses)")
+    parser.add_argument("--import-script", metavar="SCRIPT",
+                        help="build a catalog from an older runner script's question dicts")
+    parser.add_argument("--out", help="where to write the imported catalog")
+    args = parser.parse_args(argv)
+    try:
+        if args.import_script:
+            catalog = import_script(args.import_script)
+            if args.out:
+                catalog.save(args.out)
+                catalog.path = args.out
+        else:
+            catalog = load_catalog(args.check)
+    except (CatalogError, OSError, SyntaxError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(describe(catalog))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Typed columnar copy of the session data (Parquet or Arrow IPC).
+
+The .csv stores timers as stringified timedeltas and mixes "NA" into
+numeric columns, so every analysis has to re-parse it. ColumnarSessionWriter
+keeps a typed copy of the same rows -- durations as durations, counts and
+grades as integers, "NA" as null, repeated labels as dictionary-encoded
+categoricals -- and writes it as one file per session, partitioned like
+
+    <root>/Subject_ID=S01/ABA_Condition=A/QuestionBankNum=1/H008b_output_data_<timestamp>.parquet
+
+so a whole study loads with pyarrow.dataset.dataset(root, partitioning="hive")
+(or pandas.read_parquet(root)) without any parsing. The partition columns
+live in the directory names, not in the files.
+
+The .csv stays the primary, crash-safe record: it is written row by row
+with fsyncs, while the columnar file is written once when the session is
+closed. TeeDataWriter sends rows to both. Needs pyarrow (optional).
+"""
+
+import importlib.util
+import os
+import re
+from datetime import timedelta
+
+PARTITION_COLUMNS = ["Subject_ID", "ABA_Condition", "QuestionBankNum"]
+
+# Column kinds; anything not listed is a plain string
+COLUMN_KINDS = {
+    "TrialNumber": "int", "Question": "category", "Solution": "string",
+    "Accuracy": "category", "Grade": "int", "GPT_Hint": "string",
+    "ProblemType": "category", "PassedQuestions": "int", "CorrectTrials": "int",
+    "IncorrectAnswers": "int", "SessionTimer": "duration", "TrialTimer": "duration",
+    "IRITimer": "float", "Subject_ID": "category", "ABA_Condition": "category",
+    "QuestionBankNum": "int", "CumulativeEarnedPoints": "int",
+    "TrialAndErrorSurveyResp": "int", "AhaSurveyResp": "int",
+    "GradeReceivedTimer": "duration", "GradeLatency": "float", "GradeSource": "category",
+    "GradeCacheHit": "category", "TimeToFirstToken": "float", "TimeToVerdict": "float",
+    "GradeSpeculated": "bool", "GradeTier": "category", "CheapModelGrade": "category",
+    "CheapModelLatency": "float", "CheapModelCost": "float", "FullModelGrade": "category",
+    "FullModelLatency": "float", "FullModelCost": "float", "TierAgreement": "bool",
+    "PromptShownNs": "int64", "FirstKeyNs": "int64", "SubmittedNs": "int64",
+    "GradeReceivedNs": "int64", "FeedbackShownNs": "int64",
+    }
+
+_TIMEDELTA = re.compile(r"^(?:(-?\d+) days?, )?(\d+):(\d{2}):(\d{2}(?:\.\d+)?)$")
+
+
+def available():
+    """True if pyarrow is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def parse_timedelta(text):
+    """str(timedelta) ('0:01:02.500000', '-1 day, 23:59:57') -> timedelta."""
+    match = _TIMEDELTA.match(text.strip())
+    if match is None:
+        raise ValueError(f"Not a timedelta: {text!r}")
+    days, hours, minutes, seconds = match.groups()
+    return timedelta(days=int(days or 0), hours=int(hours), minutes=int(minutes),
+                     seconds=float(seconds))
+
+
+def to_typed(kind, value):
+    """A data-row value as the Python value for its column kind (None for NA)."""
+    if value is None or (isinstance(value, str) and value.strip() in ("", "NA")):
+        return None
+    if kind in ("int", "int64"):
+        return int(value)
+    if kind == "float":
+        return float(value)
+    if kind == "duration":
+        return value if isinstance(value, timedelta) else parse_timedelta(str(value))
+    if kind == "bool":
+        if isinstance(value, bool):
+            return value
+        return {"yes": True, "true": True, "no": False, "false": False}[str(value).lower()]
+    return str(value)
+
+
+def typed_columns(header, rows):
+    """{column: [typed values]} for the given rows."""
+    kinds = [COLUMN_KINDS.get(name, "string") for name in header]
+    return {name: [to_typed(kind, row[i]) for row in rows]
+            for i, (name, kind) in enumerate(zip(header, kinds))}
+
+
+def arrow_schema(header):
+    import pyarrow as pa
+    types = {"int": pa.int32(), "int64": pa.int64(), "float": pa.float64(), "duration": pa.duration("us"),
+             "bool": pa.bool_(), "string": pa.string(),
+             "category": pa.dictionary(pa.int32(), pa.string())}
+    return pa.schema([(name, types[COLUMN_KINDS.get(name, "string")]) for name in header])
+
+
+def partition_path(root, values):
+    """<root>/Subject_ID=.../ABA_Condition=.../QuestionBankNum=... (hive style)."""
+    parts = []
+    for name in PARTITION_COLUMNS:
+        value = re.sub(r"[^A-Za-z0-9._-]", "_", str(values.get(name, "NA"))) or "NA"
+        parts.append(f"{name}={value}")
+    return os.path.join(root, *parts)
+
+
+class ColumnarSessionWriter:
+    """Collects a session's rows and writes them typed on close()."""
+
+    def __init__(self, root, header, partition_values, file_name, format="parquet"):
+        if format not in ("parquet", "arrow"):
+            raise ValueError("format must be 'parquet' or 'arrow'")
+        if not available():
+            raise ImportError("pyarrow is needed for Parquet/Arrow output (pip install pyarrow)")
+        self.header = list(header)
+        self.format = format
+        self.file_loc = os.path.join(partition_path(root, partition_values),
+                                     f"{file_name}.{format}")
+        self.rows = []
+        self.rows_written = 0
+        self.closed = False
+
+    def write_row(self, row):
+        self.rows.append(list(row))
+        self.rows_written += 1
+
+    def checkpoint(self):
+        pass # The .csv is the durable copy while the session runs
+
+    def table(self):
+        import pyarrow as pa
+        columns = [name for name in self.header if name not in PARTITION_COLUMNS]
+        keep = [self.header.index(name) for name in columns]
+        data = typed_columns(columns, [[row[i] for i in keep] for row in self.rows])
+        return pa.Table.from_pydict(data, schema=arrow_schema(columns))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        table = self.table()
+        os.makedirs(os.path.dirname(self.file_loc), exist_ok=True)
+        tmp_loc = self.file_loc + ".tmp"
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, tmp_loc)
+        else:
+            import pyarrow as pa
+            with pa.OSFile(tmp_loc, "wb") as sink, pa.ipc.new_file(sink, table.schema) as ipc:
+                ipc.write_table(table)
+        os.replace(tmp_loc, self.file_loc)
+
+
+class TeeDataWriter:
+    """Sends every row to a primary writer (the .csv) and any number of others."""
+
+    def __init__(self, primary, *others):
+        self.primary = primary
+        self.others = list(others)
+
+    @property
+    def file_loc(self):
+        return self.primary.file_loc
+
+    @property
+    def rows_written(self):
+        return self.primary.rows_written
+
+    @property
+    def closed(self):
+        return self.primary.closed
+
+    def write_row(self, row):
+        self.primary.write_row(row)
+        for other in self.others:
+            other.write_row(row)
+
+    def checkpoint(self):
+        self.primary.checkpoint()
+        for other in self.others:
+            other.checkpoint()
+
+    def close(self):
+        self.primary.close()
+        for other in self.others:
+            other.close()
@@ -0,0 +1,147 @@
+"""
+Pre-warmed, kept-alive HTTP connections for GPT grading.
+
+The first grade of a session used to pay for DNS, the TCP connect and the
+TLS handshake, so trial 1's grade came back later than the rest. After a
+long think, the idle connection could also have been dropped, and the next
+grade paid for all of it again.
+
+ConnectionPool builds the HTTP client the OpenAI client sends through: one
+pool with keep-alive, and HTTP/2 when the h2 package is installed. warm()
+returns at once and opens a connection on a background thread, while the
+experimenter fills in the setup screen. That thread then keeps the
+connection alive by pinging GET /models whenever the pool has been idle for
+`keepalive_interval` seconds. /models costs no tokens.
+
+Each request is traced, so the pool knows whether it reused a connection
+or opened a new one (and how long that took):
+
+    pool = ConnectionPool(http2=True, keepalive_interval=30)
+    client = OpenAI(http_client=pool.http_client(), ...)
+    pool.warm(f"{client.base_url}models", client.api_key)
+    ...
+    pool.stats()   # {"requests": 41, "new_connections": 1, "reused": 40, ...}
+
+The runner writes the stats to the session journal and prints them at the
+end of the session.
+
+Some openai versions stop reading a streamed reply at "data: [DONE]". Over
+HTTP/1.1 the unread end of the body then costs the connection, so every
+streamed grade opens a new one. Over HTTP/2 only that stream is reset.
+The stats show which of these is happening.
+"""
+
+import threading
+from importlib.util import find_spec
+from time import perf_counter
+
+
+def http2_available():
+    return find_spec("h2") is not None
+
+
+class ConnectionPool:
+    """One kept-alive HTTP connection pool, with reuse counters."""
+
+    def __init__(self, http2=True, max_connections=20, keepalive_expiry=120.0,
+                 keepalive_interval=30.0):
+        self.http2 = http2 and http2_available()
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry     # Idle connections closed by us after this
+        self.keepalive_interval = keepalive_interval # Ping when idle this long (None: never)
+        self._client = None
+        self._lock = threading.Lock()
+        self._local = threading.local() # Connect start time of this thread's request
+        self._stop = threading.Event()
+        self._thread = None
+        self._ping = None
+        self._last_used = perf_counter()
+        self.counts = {"requests": 0, "new_connections": 0, "tls_handshakes": 0,
+                       "pings": 0, "ping_failures": 0}
+        self.connect_ms = [] # Connect (+ TLS) time of each new connection
+
+    def http_client(self):
+        """The pool's httpx Client (built on the first call)."""
+        if self._client is None:
+            import httpx # Only needed once there is a client to build
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections,
+                                  keepalive_expiry=self.keepalive_expiry)
+            self._client = httpx.Client(http2=self.http2, limits=limits,
+                                        event_hooks={"request": [self._on_request]})
+        return self._client
+
+    def _on_request(self, request):
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event, info):
+        # httpcore calls this for every step of the request; only the
+        # connection set-up and the request headers going out matter here
+        if event == "connection.connect_tcp.started":
+            self._local.connect_started = perf_counter()
+        elif event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.counts["new_connections"] += 1
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self.counts["tls_handshakes"] += 1
+        elif event.endswith("send_request_headers.started"):
+            # A new connection is ready (connected, TLS done) once its first
+            # request goes out
+            started = getattr(self._local, "connect_started", None)
+            self._local.connect_started = None
+            with self._lock:
+                self.counts["requests"] += 1
+                if started is not None:
+                    self.connect_ms.append(round((perf_counter() - started) * 1000, 1))
+            self._last_used = perf_counter()
+
+    def ping(self):
+        """Send the warm-up request; returns True if the server answered at all."""
+        url, headers = self._ping
+        try:
+            self.http_client().get(url, headers=headers, timeout=10.0)
+        except Exception: # Grading copes with a missing connection; only count it
+            with self._lock:
+                self.counts["ping_failures"] += 1
+            return False
+        with self._lock:
+            self.counts["pings"] += 1
+        return True
+
+    def warm(self, url, api_key=None):
+        """Open a connection to `url` in the background and keep it alive; returns at once."""
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._ping = (url, headers)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._keep_alive, name="keepalive",
+                                            daemon=True)
+            self._thread.start()
+
+    def _keep_alive(self):
+        self.ping()
+        if not self.keepalive_interval:
+            return
+        while not self._stop.wait(self.keepalive_interval / 2):
+            if perf_counter() - self._last_used >= self.keepalive_interval:
+                self.ping()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts, connect_ms=list(self.connect_ms))
+        stats["reused"] = max(0, stats["requests"] - stats["new_connections"])
+        stats["http2"] = self.http2
+        return stats
+
+    def summary(self):
+        s = self.stats()
+        connect = (f", connecting took {', '.join(f'{ms:g}' for ms in s['connect_ms'])} ms"
+                   if s["connect_ms"] else "")
+        return (f"HTTP{'/2' if s['http2'] else '/1.1'}: {s['requests']} requests "
+                f"({s['pings']} warm-up/keep-alive), {s['new_connections']} new connection(s), "
+                f"{s['reused']} reused{connect}")
+
+    def close(self):
+        self._stop.set()
+        if self._client is not None:
+            self._client.close()
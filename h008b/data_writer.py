@@ -0,0 +1,202 @@
+"""
+Append-only data writer for a single experimental session.
+
+Earlier versions of the runner kept every row in `list_of_answers` and
+re-wrote the whole .csv on every prompt. This writer keeps one file handle
+open for the session, appends each row once, and flushes/fsyncs at the same
+points where the old full rewrite happened (start of every answer loop,
+after each survey, end of session). The .csv layout is unchanged: one header
+row followed by one row per event.
+"""
+
+from csv import writer, QUOTE_MINIMAL
+import os
+import queue
+import threading
+
+
+class SessionDataWriter:
+    """Keeps a session .csv open and appends rows to it as they happen."""
+
+    def __init__(self, file_loc, header, sync=True, append=False):
+        self.file_loc = file_loc
+        self.sync = sync # fsync at checkpoints (turn off for simulations)
+        folder = os.path.dirname(file_loc)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        # append=True carries on an existing file (resumed sessions)
+        self.dropped_row = None # Partly written last row cut off on resume, if any
+        if append and os.path.exists(file_loc):
+            self.dropped_row = self._drop_torn_row(file_loc)
+        existing = append and os.path.exists(file_loc) and os.path.getsize(file_loc) > 0
+        # Line-buffering is not used on purpose; rows are only pushed to
+        # disk at checkpoints so a burst of rows costs a single fsync.
+        self._file = open(file_loc, 'a' if existing else 'w', newline='', encoding='utf-8')
+        self._writer = writer(self._file, quoting=QUOTE_MINIMAL)
+        self.rows_written = 0
+        if not existing:
+            self._writer.writerow(header)
+        self.checkpoint()
+
+    @staticmethod
+    def _drop_torn_row(file_loc):
+        """Cut a row left half-written by a crash off the end of the file; returns it."""
+        with open(file_loc, 'r+b') as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1 # Every complete row ends in "\r\n"
+            if end == len(data):
+                return None
+            f.truncate(end)
+        return data[end:].decode('utf-8', errors='replace')
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def write_row(self, row):
+        """Append a single event/trial row (buffered until next checkpoint)."""
+        self._writer.writerow(row)
+        self.rows_written += 1
+
+    def checkpoint(self):
+        """Push everything written so far to disk."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.checkpoint()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ListDataWriter:
+    """In-memory stand-in for SessionDataWriter (simulations, servers)."""
+
+    def __init__(self, header=None):
+        self.file_loc = None
+        self.rows = [header] if header is not None else []
+        self.rows_written = 0
+        self.closed = False
+
+    def write_row(self, row):
+        self.rows.append(row)
+        self.rows_written += 1
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class DataSink:
+    """One writer thread serving the data files of many sessions.
+
+    Used when a single process hosts many stations: session code never
+    touches the disk itself, it just queues rows. Each session still gets
+    its own .csv in the usual format. A failed write doesn't stop the
+    other sessions; the first error is kept (on the session's handle, and
+    here) and raised by QueuedSessionWriter.flush() and DataSink.close().
+    """
+
+    def __init__(self, sync=True):
+        self.sync = sync
+        self.error = None # First write error of any session
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="data-sink", daemon=True)
+        self._thread.start()
+
+    def open_session(self, file_loc, header):
+        """Returns a writer with the SessionDataWriter interface."""
+        handle = QueuedSessionWriter(self, file_loc)
+        self._queue.put(("open", handle, header))
+        return handle
+
+    def _run(self):
+        writers = {}
+        while True:
+            op, handle, arg = self._queue.get()
+            try:
+                if op == "stop":
+                    break
+                if op == "open":
+                    writers[handle] = SessionDataWriter(handle.file_loc, arg, sync=self.sync)
+                elif op == "row":
+                    writers[handle].write_row(arg)
+                elif op == "checkpoint":
+                    writers[handle].checkpoint()
+                elif op == "close":
+                    writers.pop(handle).close()
+            except Exception as e: # Don't let one bad file stop everyone's data
+                self._failed(handle, e)
+            finally:
+                if arg is not None and op == "flush":
+                    arg.set()
+                self._queue.task_done()
+        for handle, w in writers.items():
+            try:
+                w.close()
+            except Exception as e:
+                self._failed(handle, e)
+
+    def _failed(self, handle, e):
+        # Only the first error counts; later ones (e.g. rows for a file that
+        # never opened) follow from it
+        if handle.error is None:
+            handle.error = e
+        if self.error is None:
+            self.error = e
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        done = threading.Event()
+        self._queue.put(("flush", None, done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Write out what is queued and stop; raises the first write error, if any."""
+        self._queue.put(("stop", None, None))
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class QueuedSessionWriter:
+    """Per-session handle onto a DataSink."""
+
+    def __init__(self, sink, file_loc):
+        self._sink = sink
+        self.file_loc = file_loc
+        self.rows_written = 0
+        self.closed = False
+        self.error = None # Set by the sink thread if writing failed
+
+    def write_row(self, row):
+        self._sink._queue.put(("row", self, list(row)))
+        self.rows_written += 1
+
+    def checkpoint(self):
+        self._sink._queue.put(("checkpoint", self, None))
+
+    def flush(self, timeout=None):
+        """Block until this session's rows are on disk; raises its first write error."""
+        self._sink.flush(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        # Doesn't wait for the sink; call flush() afterwards to find out
+        # whether the file was written in full
+        if not self.closed:
+            self.closed = True
+            self._sink._queue.put(("close", self, None))
@@ -0,0 +1,487 @@
+"""
+H008b session engine.
+
+Session holds everything that used to be module-level state in the runner
+script (trial counters, points, question queue, timers, the data file) and
+exposes the session as a small non-interactive API:
+
+    session = Session("S01", "A", "1", grading_worker)
+    while session.next_question() is not None:
+        outcome = session.submit_response("day 59")
+        if outcome.accuracy == "Correct":
+            session.record_survey(3, 5)        # moves on to the next question
+        ...
+        session.pass_question()                # or skip it for now
+    session.close()
+
+The terminal runner (H008b_Caffeine_and_Insight_ExpProgram.py) drives one
+Session with input(); simulations and load tests can drive as many as they
+like in one process.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from random import Random
+import csv
+import os
+
+from h008b.columnar import ColumnarSessionWriter, TeeDataWriter
+from h008b.journal import (SessionJournal, JournalError, journal_path, read_events,
+                           replay)
+from h008b.data_writer import SessionDataWriter
+from h008b.grading import prompt_catalog, split_evaluation
+from h008b.ordering import bank_orders
+from h008b.routing import RouteRecord
+from h008b.streaming import FeedbackStream
+from h008b.timing import (TrialEvents, EVENT_COLUMNS, now_ns, ns_seconds, ns_timedelta)
+from h008b.questions import dict_of_question_info, dict_of_question_banks
+
+# Setup data variables for session
+DATA_HEADER = ["TrialNumber", "Question", "Solution", "Accuracy",
+               "Grade", "GPT_Hint", "ProblemType", "PassedQuestions",
+               "CorrectTrials", "IncorrectAnswers", "SessionTimer",
+               "TrialTimer", "IRITimer",
+               # New variables
+               "Subject_ID", "ABA_Condition", "QuestionBankNum",
+               "CumulativeEarnedPoints",
+               "TrialAndErrorSurveyResp", "AhaSurveyResp",
+               "GradeReceivedTimer", "GradeLatency", "GradeSource",
+               "GradeCacheHit", "TimeToFirstToken", "TimeToVerdict",
+               "GradeSpeculated", "GradeTier", "CheapModelGrade", "CheapModelLatency",
+               "CheapModelCost", "FullModelGrade", "FullModelLatency", "FullModelCost",
+               "TierAgreement", *EVENT_COLUMNS
+               ]
+
+# Point system
+correct_reward = 250
+skip_cost      = 20
+incorrect_point_dict = { # Dictionary for point allocation
+    "1" : 0,
+    "2" : 10,
+    "3" : 20,
+    "4" : 30
+    }
+# Shown in place of a hint when a response couldn't be graded
+review_feedback = "Your answer couldn't be checked right now and has been saved for the experimenter to review"
+
+# What submit_response() hands back to the caller
+ResponseOutcome = namedtuple("ResponseOutcome", ["accuracy", "feedback", "grade", "points"])
+
+
+class SessionError(Exception):
+    """Raised when a Session is driven out of order (e.g. no current question)."""
+
+
+class Session:
+    """State and rules for one participant's experimental session."""
+
+    def __init__(self, subject_ID, ABA_condition, question_bank_num, grading_worker,
+                 data_writer=None, data_folder="data", session_minutes=30,
+                 question_info=None, question_banks=None, rng=None, prompts=None,
+                 speculative_grader=None, columnar_folder=None, columnar_format="parquet",
+                 journal_folder=None, order_number=None, order_seed=None):
+        self.subject_ID = subject_ID
+        self.ABA_condition = ABA_condition
+        self.question_bank_num = question_bank_num
+        self.grading_worker = grading_worker
+        self.question_info = question_info or dict_of_question_info
+        question_banks = question_banks or dict_of_question_banks
+        if question_bank_num not in question_banks:
+            raise KeyError(f"Unknown question bank {question_bank_num!r}")
+        self.rng = rng or Random()
+        # Grading prompts are built once per process and shared by all sessions
+        self.prompts = prompts or prompt_catalog(self.question_info)
+        # Optional SpeculativeGrader for drafts (see speculate())
+        self.speculative_grader = speculative_grader
+
+        # Counters
+        self.trial_number      = 0
+        self.passed_trials     = 0
+        self.correct_trials    = 0
+        self.incorrect_answers = 0
+        self.earned_points     = 0 # cumulative earned points
+
+        # Timing variables; all timers run on perf_counter_ns (see h008b/timing.py)
+        self.start_time = datetime.now() # Wall clock, only for naming the data file
+        self.timestamp  = self.start_time.strftime("%Y-%m-%d_%H-%M-%S")  # Replace `:` with `-`; for data file
+        self.start_ns   = now_ns()
+        self.trial_start_ns   = self.start_ns
+        self.prev_response_ns = self.start_ns # IRI runs from here to the next submission
+        self.deadline_ns = self.start_ns + int(session_minutes * 60e9)
+        self.events = TrialEvents() # Stamps for the response being worked on
+        self._prompt_shown = False  # First prompt of the current trial marked yet
+        self._pending_row = None    # (row, events) waiting for its feedback to be shown
+
+        # Question queue (passed questions are appended to the end). With an
+        # order_number (e.g. the subject number) the order is counterbalanced
+        # across subjects; otherwise it is drawn from rng.
+        orders = bank_orders(question_banks[question_bank_num], self.question_info)
+        if order_number is not None:
+            self.questions = orders.counterbalanced(order_number, order_seed)
+        else:
+            self.questions = orders.sample(self.rng)
+        self.question_order_dict = {q: str(i + 1) for i, q in enumerate(self.questions)}
+        self.num_questions = len(self.questions)
+        self._queue_pos = 0
+
+        # Current question (kept after it is answered so later rows, e.g.
+        # TimerElapsed, still show the last question like they always have)
+        self.question_shorthand = None
+        self.answering = False
+        self.prompt = None
+        self.last_response = None
+        self.last_job = None # GradingJob for the last graded response
+        self.last_grading = ("NA", "NA")
+        self.finished = False
+        self.dropped_row = None # Half-written .csv row removed when resuming, if any
+
+        if data_writer is None:
+            data_writer = SessionDataWriter(
+                f"{data_folder}/H008b_output_data_{self.timestamp}.csv", DATA_HEADER)
+        if columnar_folder is not None:
+            # Typed Parquet/Arrow copy of the .csv, named after it (see h008b/columnar.py)
+            file_name = (os.path.splitext(os.path.basename(data_writer.file_loc))[0]
+                         if data_writer.file_loc else f"H008b_output_data_{self.timestamp}")
+            data_writer = TeeDataWriter(data_writer, ColumnarSessionWriter(
+                columnar_folder, DATA_HEADER,
+                {"Subject_ID": subject_ID, "ABA_Condition": ABA_condition,
+                 "QuestionBankNum": question_bank_num},
+                file_name, format=columnar_format))
+        self.data_writer = data_writer
+
+        # Write-ahead journal for resuming after a crash (see h008b/journal.py)
+        self.journal = None
+        if journal_folder is not None:
+            self.journal = SessionJournal(journal_path(journal_folder, self.timestamp))
+            if not self.journal.resumed:
+                self._log("start", subject=subject_ID, condition=ABA_condition,
+                          bank=question_bank_num, questions=self.questions,
+                          duration_ms=session_minutes * 60000,
+                          data_file=data_writer.file_loc, timestamp=self.timestamp)
+
+    @classmethod
+    def resume(cls, journal_file, grading_worker, data_writer=None, **kwargs):
+        """Rebuild an interrupted session from its journal and carry on.
+
+        Rows are appended to the session's original .csv; kwargs are passed
+        on to Session() (question_info, speculative_grader, ...).
+        """
+        kwargs.pop("journal_folder", None) # Keeps writing to journal_file
+        state = replay(read_events(journal_file))
+        if state["ended"] or state["finished"]:
+            raise JournalError(f"Session {state['timestamp']} already finished")
+        if data_writer is None:
+            data_writer = SessionDataWriter(state["data_file"], DATA_HEADER, append=True)
+        session = cls(state["subject"], state["condition"], state["bank"], grading_worker,
+                      data_writer=data_writer, session_minutes=state["duration_ms"] / 60000,
+                      **kwargs)
+        session._restore(state, journal_file)
+        dropped = getattr(data_writer, "dropped_row", None)
+        if dropped is not None:
+            # A row the crash cut short; kept in the journal, not the data
+            session.dropped_row = dropped
+            session._log("dropped_row", row=dropped)
+        return session
+
+    def _restore(self, state, journal_file):
+        # Time spent crashed doesn't count: the clock picks up where it stopped
+        self.start_ns = now_ns() - state["elapsed_ms"] * 1_000_000
+        self.deadline_ns = self.start_ns + state["duration_ms"] * 1_000_000
+        self.timestamp = state["timestamp"]
+        self.questions = list(state["questions"])
+        self.question_order_dict = {q: str(i + 1) for i, q in enumerate(self.questions)}
+        self._queue_pos = state["queue_pos"]
+        self.trial_number = state["trial_number"]
+        self.passed_trials = state["passed"]
+        self.correct_trials = state["correct"]
+        self.incorrect_answers = state["incorrect"]
+        self.earned_points = state["points"]
+        self.journal = SessionJournal(journal_file)
+        if isinstance(self.data_writer, TeeDataWriter):
+            # The columnar copy is written on close; give it the rows from before the crash
+            with open(state["data_file"], newline="", encoding="utf-8") as f:
+                rows = [row for row in csv.reader(f)][1:]
+            for other in self.data_writer.others:
+                for row in rows:
+                    if len(row) == len(DATA_HEADER):
+                        other.write_row(row)
+
+    def _elapsed_ms(self):
+        return (now_ns() - self.start_ns) // 1_000_000
+
+    def _log(self, event, **fields):
+        if self.journal is not None:
+            self.journal.record(event, self._elapsed_ms(), **fields)
+
+    def note(self, event, **fields):
+        """Journal an event of the caller's own (replay skips it), e.g. client stats."""
+        self._log(event, **fields)
+
+    # ------------------------------------------------------------------
+    # Session flow
+    @property
+    def current_question(self):
+        """Info dict for the question being answered (None between questions)."""
+        if not self.answering:
+            return None
+        return self.question_info[self.question_shorthand]
+
+    @property
+    def current_question_number(self):
+        return self.question_order_dict.get(self.question_shorthand)
+
+    def time_remaining(self):
+        return ns_timedelta(self.deadline_ns - now_ns())
+
+    def next_question(self):
+        """Move on to the next question; returns its shorthand or None if done."""
+        self._flush_row()
+        self.data_writer.checkpoint()
+        self.answering = False
+        if self.finished or self._queue_pos >= len(self.questions):
+            return None
+        # Check if timer has ellapsed
+        if now_ns() >= self.deadline_ns:
+            self.write_data_row("TimerElapsed", "NA", "NA", "NA", "NA", "NA")
+            self.finished = True
+            self._log("timer")
+            self.data_writer.checkpoint()
+            return None
+        question = self.questions[self._queue_pos]
+        self._queue_pos += 1
+        self.trial_number += 1 # Increment trial number by 1
+        self.trial_start_ns = self.prev_response_ns = now_ns()
+        self.events = TrialEvents()
+        self._prompt_shown = False
+        self.question_shorthand = question
+        self.answering = True
+        self.prompt = self.prompts[question]
+        self._log("question", q=question)
+        if self.speculative_grader is not None:
+            self.speculative_grader.reset(question)
+        return question
+
+    def submit_response(self, response, wait_callback=None, wait_interval=0.1):
+        """Grade a response to the current question.
+
+        wait_callback(job) is called every `wait_interval` seconds while the
+        grade is on its way, so a UI can keep itself alive (and show
+        job.stream.visible_hint() if the grader streams). Returns a
+        ResponseOutcome; for a correct answer the Correct row is written by
+        record_survey().
+        """
+        job = self.begin_response(response)
+        while wait_callback is not None and not job.wait(wait_interval):
+            wait_callback(job)
+        return self.finish_response(job)
+
+    def speculate(self, draft):
+        """Start grading a draft of the current answer before it's submitted.
+
+        No-op without a speculative_grader. If the same text is submitted
+        later, begin_response() picks up this grade instead of starting over.
+        """
+        if self.speculative_grader is None or not self.answering:
+            return False
+        return self.speculative_grader.speculate(self.prompt, self.question_shorthand, draft)
+
+    # Screen events, reported by the front-end as they happen
+    def mark_prompt_shown(self):
+        """The (retry) prompt is on screen; the trial timer starts at the first one."""
+        ns = self.events.mark("prompt_shown")
+        if not self._prompt_shown and self.answering:
+            self._prompt_shown = True
+            self.trial_start_ns = self.prev_response_ns = ns
+
+    def mark_first_key(self):
+        """The participant started typing."""
+        self.events.mark("first_key")
+
+    def mark_feedback_shown(self, job=None):
+        """The outcome of `job` (default: the last graded one) is on screen."""
+        job = job or self.last_job
+        events = getattr(job, "events", None)
+        if events is None or events.get("feedback_shown") is not None:
+            return
+        self.prev_response_ns = events.mark("feedback_shown")
+        self._flush_row()
+
+    def begin_response(self, response):
+        """Send a response off for grading; returns its GradingJob.
+
+        Non-blocking half of submit_response() for event-loop front-ends:
+        wait on job.future, then call finish_response(job).
+        """
+        self._require_question()
+        self._flush_row()
+        self.last_response = response
+        job = None
+        if self.speculative_grader is not None:
+            job = self.speculative_grader.claim(self.question_shorthand, response)
+            if job is not None:
+                job.speculated = True
+        if job is None:
+            stream, route = FeedbackStream(), RouteRecord()
+            job = self.grading_worker.submit(self.prompt, self.question_shorthand, response,
+                                             stream=stream, route=route)
+            stream.started_ns = job.submitted_ns
+            job.stream, job.route = stream, route
+        # The next attempt gets fresh stamps
+        job.events, self.events = self.events, TrialEvents()
+        job.events.mark("submitted", job.submitted_ns)
+        job.iri_start_ns = self.prev_response_ns
+        return job
+
+    def finish_response(self, job):
+        """Apply a finished GradingJob to the session; returns a ResponseOutcome."""
+        response = self.last_response
+        evaluation, source, cache_flag = job.result()
+        self.last_job = job
+        self.last_grading = (source, cache_flag)
+        job.events.mark("grade_received", job.graded_ns)
+        # The next IRI runs from when this outcome was shown (or, until the
+        # front-end says so, from when the grade came back)
+        self.prev_response_ns = job.events.get("feedback_shown") or job.graded_ns
+
+        accuracy, GPT_score, feedback = split_evaluation(evaluation)
+        # If correct
+        if accuracy == "Correct":
+            self.correct_trials += 1
+            self.earned_points += correct_reward
+            self._log("response", r=response, a="Correct", g="NA", p=correct_reward)
+            return ResponseOutcome("Correct", "NA", "NA", correct_reward)
+
+        # No usable grade (model unavailable, or a reply in the wrong format):
+        # log it for the experimenter to review and let the participant go on
+        if accuracy == "Review":
+            self.write_data_row(response, "Review", "NA", "NA", "NA", "NA", job)
+            self._log("response", r=response, a="Review", g="NA", p=0)
+            return ResponseOutcome("Review", review_feedback, "NA", 0)
+
+        # If incorrect
+        self.incorrect_answers += 1
+        # Update scoring
+        points = int(incorrect_point_dict[GPT_score])
+        self.earned_points += points
+        self.write_data_row(response, "Incorrect", feedback, GPT_score, "NA", "NA", job)
+        self._log("response", r=response, a="Incorrect", g=GPT_score, p=points)
+        return ResponseOutcome("Incorrect", feedback, GPT_score, points)
+
+    def pass_question(self, response="pass"):
+        """Skip the current question for now; it comes back at the end."""
+        self._require_question()
+        self.earned_points -= skip_cost
+        self.passed_trials += 1
+        self.events.mark("submitted")
+        self.write_data_row(response, "Pass", "NA", "NA", "NA", "NA", events=self.events)
+        self._log("pass", p=-skip_cost)
+        self.questions.append(self.question_shorthand) # Add question to the end of the list
+        self.answering = False
+        self.data_writer.checkpoint()
+
+    def record_survey(self, trial_and_error_survey_resp, insight_survey_resp):
+        """Log the post-solution survey; this writes the question's Correct row."""
+        self._require_question()
+        for resp in (trial_and_error_survey_resp, insight_survey_resp):
+            if not (isinstance(resp, int) and 1 <= resp <= 5):
+                raise ValueError("Survey responses must be integers between 1 and 5")
+        self.write_data_row(self.last_response, "Correct", "NA", "NA",
+                            trial_and_error_survey_resp, insight_survey_resp, self.last_job)
+        self._log("survey", tae=trial_and_error_survey_resp, aha=insight_survey_resp)
+        self.answering = False
+        self.data_writer.checkpoint()
+
+    def close(self, interrupted=False):
+        """End the session and close the data file.
+
+        interrupted=True (after an error) leaves the journal open-ended so
+        the session can still be resumed with Session.resume().
+        """
+        self.finished = True
+        if self.speculative_grader is not None:
+            self.speculative_grader.reset()
+        self._flush_row()
+        self.data_writer.close()
+        if self.journal is not None:
+            if not interrupted:
+                self._log("end")
+            self.journal.close()
+
+    def _require_question(self):
+        if not self.answering:
+            raise SessionError("No current question; call next_question() first")
+
+    # ------------------------------------------------------------------
+    # Data
+    def _flush_row(self):
+        """Write the row held back for its feedback stamp (see write_data_row)."""
+        if self._pending_row is None:
+            return
+        row, events = self._pending_row
+        self._pending_row = None
+        row[-len(EVENT_COLUMNS):] = events.columns(self.start_ns)
+        self.data_writer.write_row(row)
+        self.data_writer.checkpoint()
+
+    def write_data_row(self, resp, correct_or_incorrect, feedback, grade, TaE_s_resp, Aha_s_resp,
+                       job=None, events=None):
+        # Timers are taken at the moment of submission when the row belongs to a
+        # graded response, so grading latency is kept out of them
+        self._flush_row()
+        first_token, verdict, speculated = "NA", "NA", "NA"
+        route_columns = RouteRecord().columns()
+        if job is not None:
+            speculated = "yes" if getattr(job, "speculated", False) else "no"
+            route = getattr(job, "route", None)
+            if route is not None:
+                route_columns = route.columns()
+            events = job.events
+            event_ns, iri_start_ns = job.submitted_ns, job.iri_start_ns
+            grade_received, grade_latency = ns_timedelta(job.graded_ns - self.start_ns), job.latency
+            source, cache_flag = self.last_grading
+            stream = getattr(job, "stream", None)
+            if stream is not None:
+                first_token, verdict = stream.time_to_first_token(), stream.time_to_verdict()
+        else:
+            event_ns = now_ns() if events is None else events.get("submitted")
+            iri_start_ns = self.prev_response_ns
+            grade_received, grade_latency, source, cache_flag = "NA", "NA", "NA", "NA"
+        events = events or TrialEvents()
+        info = self.question_info.get(self.question_shorthand, {})
+        row = [self.trial_number,       # Trial number (fixed within a question)
+        self.question_shorthand,        # Question name shorthand
+        resp,                           # Participant response
+        correct_or_incorrect,           # "Correct" or "Incorrect" string
+        grade,                          # Grade evaluation of incorrect answer (1-5)
+        feedback,                       # GPT feedback
+        info.get("problem_type", "NA"), # Probelem type (e.g., "SPATIAL")
+        self.passed_trials,             # Number of questions "passed" by participant
+        self.correct_trials,            # Incrementing counter of correct answers
+        self.incorrect_answers,         # Incrementing counter of incorrect answers
+        ns_timedelta(event_ns - self.start_ns),       # Session timer
+        ns_timedelta(event_ns - self.trial_start_ns), # Trial timer
+        ns_seconds(event_ns - iri_start_ns),          # Inter-response-interval timer
+        # New data points
+        self.subject_ID,                # Unique subject identifier
+        self.ABA_condition,             # ABA Condition (A or B)
+        self.question_bank_num,         # Question bank (1-3)
+        self.earned_points,             # Cumulative earned points in this session
+        TaE_s_resp,                     # Response to trial-and-error survey
+        Aha_s_resp,                     # Response to insight ('aha') survey
+        grade_received,                 # Session timer when the grade came back
+        grade_latency,                  # Seconds spent waiting on the grader
+        source,                         # Who graded it ("local" or "GPT")
+        cache_flag,                     # GPT grade served from the cache ("hit"/"miss")
+        first_token,                    # Seconds from submission to first streamed token
+        verdict,                        # Seconds from submission to known correct/incorrect
+        speculated,                     # Grade reused from a draft graded while typing
+        *route_columns,                 # Model tier(s) used, their grades/latency/cost, agreement
+        *events.columns(self.start_ns)  # Prompt/first key/submit/grade/feedback, ns into the session
+        ]
+        if job is not None and correct_or_incorrect != "Correct" and events.get("feedback_shown") is None:
+            # Held back until the hint/review notice is on screen (mark_feedback_shown())
+            # so the row gets its FeedbackShownNs; written at the latest by the next call
+            self._pending_row = (row, events)
+            return
+        # Append current response to data file (pushed to disk at next checkpoint)
+        self.data_writer.write_row(row)
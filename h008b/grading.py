@@ -0,0 +1,293 @@
+"""
+Response grading pipeline.
+
+    local grader  ->  grading cache  ->  LLM
+
+ResponseGrader strings the three together: the local matcher decides
+clear-cut answers, the cache serves answers someone already gave, and only
+what's left goes to the LLM. It is a plain callable, so it can be handed to a
+GradingWorker or swapped for a stub grader in simulations.
+
+Evaluations are always in the format the GPT prompt asks for: "yes" for a
+correct answer, otherwise a sentence of feedback followed by a 1-4 grade.
+The one exception is REVIEW_EVALUATION, given when no grade could be had
+(see h008b/resilience.py); the response is then left for the experimenter.
+"""
+
+import re
+import string
+from math import exp
+
+from h008b.resilience import GradingUnavailable
+
+_NUMBERED_LINE = re.compile(r"^\s*(\d+)\s*[:.)]\s*(.+?)\s*$")
+
+# Stands in for an evaluation when the grading model is unavailable
+REVIEW_EVALUATION = "review"
+GRADES = "1234" # The grades an incorrect evaluation can end in
+
+
+def split_evaluation(evaluation):
+    """Evaluation string -> (accuracy, grade, hint), as Session records it.
+
+    Accuracy is "Correct", "Incorrect", or "Review" for REVIEW_EVALUATION
+    and for replies in the wrong format.
+    """
+    if evaluation.lower() == "yes":
+        return "Correct", "NA", "NA"
+    if not evaluation or evaluation == REVIEW_EVALUATION or evaluation[-1] not in GRADES:
+        return "Review", "NA", "NA"
+    return "Incorrect", evaluation[-1], evaluation[:-2].rstrip(string.punctuation + string.whitespace)
+
+
+# ChatGPT gets this prompt along with a subject's written response, and will
+# return either "yes" or feedback + grade based on how close it is. It is sent
+# as the system message and only the response goes in the user turn, so the
+# (long) prompt is a stable prefix that providers can cache across attempts.
+GRADING_PROMPT_TEMPLATE = """\
+You are an expert in the psychological process of insight. Your goal is to
+evaluate the responses of experimental subjects to the following insight
+riddle: {insight_question}. You know that the correct
+answer is something along the lines of: {insight_answer}.
+If you are given a solution that is close enough to this one, respond with
+'yes' and only yes.  If some other non-insightful solution, respond with a
+sentence of feedback on why that answer is incorrect without giving away the
+answer. For example, if someone were to give the answer
+{possible_incorrect_solution} a suitable response from you
+might be {possible_incorrect_feedback}. It is of paramount
+importance that you do not give away the answer in your hint. Make sure to
+double check that your feedback does not give away the answer. Also, note
+that in your feedback, don't ever refer to these as riddles, but refer to them
+as problems.
+In addition to the verbal feedback for incorrect answers, create a numeric grade to
+evaluate the degree of correctness of the participants answer. The number should
+on a scale of 1-4, with 1 (nonsense), 2 (sensical but far from a correct solution),
+3 (may contains some key words but far from the solution), 4 (contains some logic
+or keywords from the correct solution, but not quite enough to be correct.).
+End your feedback response for incorrect answers with a single number evaluating their
+correctness with no additional punctuation.
+The solution to evaluate will be given in the next message."""
+
+
+def build_grading_prompt(question):
+    return GRADING_PROMPT_TEMPLATE.format(
+        insight_question = question["insight_question"],
+        insight_answer = question["insight_answer"],
+        possible_incorrect_solution = question["possible_incorrect_solution"],
+        possible_incorrect_feedback = question["possible_incorrect_feedback"])
+
+
+def solution_message(user_solution):
+    """The (short) user turn that carries a participant's answer."""
+    return f"Here is the solution to evaluate: '{user_solution}'."
+
+
+class PromptCatalog:
+    """Grading prompts for every question, built once at startup."""
+
+    def __init__(self, question_info):
+        self._prompts = {shorthand: build_grading_prompt(info)
+                         for shorthand, info in question_info.items()}
+
+    def __getitem__(self, shorthand):
+        return self._prompts[shorthand]
+
+    def __len__(self):
+        return len(self._prompts)
+
+
+_prompt_catalogs = {}
+
+def prompt_catalog(question_info):
+    """The shared PromptCatalog for a question dict (built on first use)."""
+    entry = _prompt_catalogs.get(id(question_info))
+    if entry is None or entry[0] is not question_info:
+        entry = _prompt_catalogs[id(question_info)] = (question_info, PromptCatalog(question_info))
+    return entry[1]
+
+
+class OpenAIEvaluator:
+    """Asks a chat-completions model to grade one response.
+
+    With stream=True the reply is requested as a stream and each piece is
+    handed to on_delta(text) as it arrives (see h008b/streaming.py); the
+    return value is the same complete evaluation either way.
+
+    on_reply(info), if given, gets the reply's token usage ("prompt_tokens",
+    "completion_tokens"; None if the server didn't say) and, with
+    logprobs=True, a "confidence" in the verdict and grade (see
+    reply_confidence()) -- used for model routing (h008b/routing.py).
+    """
+
+    reports_usage = True
+
+    def __init__(self, client, model, stream=False, logprobs=False):
+        self.client = client
+        self.model = model
+        self.stream = stream
+        self.logprobs = logprobs
+
+    def __call__(self, prompt, user_solution, on_delta=None, on_reply=None):
+        messages = [
+            {"role": "system",
+             "content": prompt}, # First is the per-question prompt w/ correct answers
+            {"role": "user",
+             "content": solution_message(user_solution)} # Next is the subject solution
+            ]
+        options = {"logprobs": True} if self.logprobs else {}
+        if not self.stream:
+            completion = self.client.chat.completions.create(
+                model= self.model, # Model; can be changed to....
+                messages= messages,
+                **options
+                )
+            model_evaluation = completion.choices[0].message.content # grab just text output
+            if on_reply is not None:
+                on_reply(reply_info(getattr(completion, "usage", None),
+                                    reply_confidence(completion.choices[0])))
+            return model_evaluation.strip()
+
+        if on_reply is not None:
+            options["stream_options"] = {"include_usage": True}
+        parts, usage = [], None
+        for chunk in self.client.chat.completions.create(model=self.model, messages=messages,
+                                                         stream=True, **options):
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                if on_delta is not None:
+                    on_delta(delta)
+        if on_reply is not None:
+            on_reply(reply_info(usage, None))
+        return "".join(parts).strip()
+
+    def evaluate_many(self, prompt, user_solutions):
+        """Grade several answers to the same question in one request.
+
+        Returns one evaluation per answer, in order; None where the reply
+        didn't contain a usable line for that answer (the caller re-grades
+        those one at a time).
+        """
+        numbered = "\n".join(f"{i + 1}: '{solution}'" for i, solution in enumerate(user_solutions))
+        batch_message = (f"Here are {len(user_solutions)} solutions from different subjects. "
+                         "Evaluate each one on its own, exactly as you would if it were the "
+                         "only solution. Reply with one line per solution, formatted as "
+                         "'<number>: <your response for that solution>', and nothing else.\n"
+                         f"{numbered}")
+        completion = self.client.chat.completions.create(
+            model= self.model,
+            messages= [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": batch_message}
+                ]
+            )
+        return parse_numbered_evaluations(completion.choices[0].message.content or "",
+                                          len(user_solutions))
+
+
+class ResponseGrader:
+    """local grader -> cache -> LLM evaluator.
+
+    Calling it returns (evaluation, source, cache_flag) where source is
+    "local" or "GPT" and cache_flag is "hit"/"miss" for GPT grades ("NA" for
+    local ones). Pass a FeedbackStream as `stream` to have a streaming
+    evaluator's reply fed into it as it arrives, and a RouteRecord as
+    `route` to have a RoutingEvaluator note which model tier graded it.
+
+    If the evaluator raises GradingUnavailable, fallback_grader (a
+    LocalGrader) gets a go (source "local-fallback"); failing that the
+    response is marked for experimenter review (REVIEW_EVALUATION, source
+    "review"). Neither is cached.
+    """
+
+    def __init__(self, evaluator, model_name, local_grader=None, cache=None,
+                 fallback_grader=None):
+        self.evaluator = evaluator
+        self.model_name = model_name
+        self.local_grader = local_grader
+        self.cache = cache
+        self.fallback_grader = fallback_grader
+
+    def __call__(self, prompt, shorthand, user_solution, stream=None, route=None):
+        try:
+            return self._grade(prompt, shorthand, user_solution, stream, route)
+        except GradingUnavailable:
+            if self.fallback_grader is not None:
+                local_evaluation = self._local(self.fallback_grader, shorthand, user_solution)
+                if local_evaluation is not None:
+                    return local_evaluation, "local-fallback", "NA"
+            return REVIEW_EVALUATION, "review", "NA"
+
+    def _grade(self, prompt, shorthand, user_solution, stream, route):
+        if self.local_grader is not None:
+            local_evaluation = self._local(self.local_grader, shorthand, user_solution)
+            if local_evaluation is not None:
+                if route is not None:
+                    route.tier = "local"
+                return local_evaluation, "local", "NA"
+        if self.cache is None:
+            return self._evaluate(prompt, user_solution, stream, route), "GPT", "NA"
+        cached_evaluation = self.cache.get(shorthand, self.model_name, prompt, user_solution)
+        if cached_evaluation is not None:
+            return cached_evaluation, "GPT", "hit"
+        model_evaluation = self._evaluate(prompt, user_solution, stream, route)
+        # A reply in the wrong format goes to review; caching it would send
+        # every later identical answer there too
+        if split_evaluation(model_evaluation)[0] != "Review":
+            self.cache.put(shorthand, self.model_name, prompt, user_solution, model_evaluation)
+        return model_evaluation, "GPT", "miss"
+
+    @staticmethod
+    def _local(grader, shorthand, user_solution):
+        # The local matcher is only a shortcut; if it breaks on an answer,
+        # treat that as "not sure" rather than let it end the session
+        try:
+            return grader.evaluate(shorthand, user_solution)
+        except Exception:
+            return None
+
+    def _evaluate(self, prompt, user_solution, stream, route):
+        if route is not None and getattr(self.evaluator, "routes", False):
+            return self.evaluator(prompt, user_solution, route=route)
+        if stream is None or not getattr(self.evaluator, "stream", False):
+            return self.evaluator(prompt, user_solution)
+        model_evaluation = self.evaluator(prompt, user_solution, on_delta=stream.feed)
+        stream.finish(model_evaluation)
+        return model_evaluation
+
+
+def reply_info(usage, confidence):
+    return {"prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "confidence": confidence}
+
+
+def reply_confidence(choice):
+    """How sure the model was of its verdict and grade, from token logprobs.
+
+    The smaller of the probabilities of the first token ('yes' or the start
+    of the feedback) and the last one (the grade). None without logprobs.
+    """
+    tokens = getattr(getattr(choice, "logprobs", None), "content", None)
+    if not tokens:
+        return None
+    tokens = [t for t in tokens if t.token.strip()] or tokens
+    return round(min(exp(tokens[0].logprob), exp(tokens[-1].logprob)), 4)
+
+
+def parse_numbered_evaluations(text, count):
+    """Split a '1: ...\n2: ...' multi-answer reply into a list (None = missing)."""
+    results = [None] * count
+    for line in text.splitlines():
+        match = _NUMBERED_LINE.match(line)
+        if match is None:
+            continue
+        i = int(match.group(1)) - 1
+        evaluation = match.group(2).strip().strip("'\"")
+        # Only accept what the single-answer path would: 'yes' or a grade digit at the end
+        if 0 <= i < count and evaluation and (evaluation.lower() == "yes" or evaluation[-1] in "1234"):
+            results[i] = evaluation
+    return results
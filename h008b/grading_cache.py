@@ -0,0 +1,108 @@
+"""
+Persistent grading cache.
+
+Participants keep typing the same answers ("triplets", "59", ...), and each
+one used to cost a fresh chat-completions call. GradingCache stores the
+evaluation GPT returned in a small SQLite file so a repeated answer comes
+back instantly and graded the same way for every session in the study.
+
+Entries are keyed by
+    question shorthand + model name + hash of the grading prompt
+    + normalized response
+so changing the prompt or the model never serves a stale grade. Old entries
+are dropped after `ttl_seconds`, and the least recently used ones are evicted
+once the cache holds more than `max_entries`.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from time import time
+
+from h008b.local_grading import normalize_response
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class GradingCache:
+    """SQLite-backed evaluation cache shared by every session on this disk."""
+
+    def __init__(self, db_path, max_entries=50000, ttl_seconds=30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        folder = os.path.dirname(db_path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        # The grading worker thread uses the connection, so guard it ourselves
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS grades (
+                       key        TEXT PRIMARY KEY,
+                       question   TEXT NOT NULL,
+                       model      TEXT NOT NULL,
+                       response   TEXT NOT NULL,
+                       evaluation TEXT NOT NULL,
+                       feedback   TEXT NOT NULL,
+                       grade      TEXT NOT NULL,
+                       created    REAL NOT NULL,
+                       last_used  REAL NOT NULL)""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS grades_last_used ON grades (last_used)")
+
+    @staticmethod
+    def make_key(shorthand, model, prompt, response):
+        parts = [shorthand, model, prompt_hash(prompt), normalize_response(response)]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, shorthand, model, prompt, response):
+        """Cached evaluation for this answer, or None."""
+        key = self.make_key(shorthand, model, prompt, response)
+        now = time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT evaluation, created FROM grades WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM grades WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE grades SET last_used = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, shorthand, model, prompt, response, evaluation):
+        key = self.make_key(shorthand, model, prompt, response)
+        # Split out feedback/grade so the table is readable on its own
+        if evaluation.lower() == "yes":
+            feedback, grade = "NA", "Correct"
+        else:
+            feedback, grade = evaluation[:-1].strip(), evaluation[-1:]
+        now = time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, shorthand, model, normalize_response(response), evaluation,
+                 feedback, grade, now, now))
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM grades WHERE created < ?", (now - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM grades").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                """DELETE FROM grades WHERE key IN (
+                       SELECT key FROM grades ORDER BY last_used LIMIT ?)""",
+                (count - self.max_entries,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
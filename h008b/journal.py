@@ -0,0 +1,141 @@
+"""
+Write-ahead journal of a session, for resuming after a crash.
+
+The .csv has the trial rows but not everything needed to carry on a
+session: the shuffled question order, the pass queue, where the session
+clock stood. Session appends one compact JSON line per event to
+data/H008b_journal_<timestamp>.jsonl, fsynced as soon as it's written:
+
+    {"e":"start","t":0,"subject":"S01","condition":"A","bank":"1","questions":[...],...}
+    {"e":"question","t":1520,"q":"day"}
+    {"e":"response","t":30877,"r":"day 59","a":"Incorrect","g":"2","p":10}
+    {"e":"pass","t":41002,"p":-20}
+    {"e":"survey","t":65010,"tae":3,"aha":5}
+    {"e":"timer","t":1800004}                 (session time ran out)
+    {"e":"end","t":1800100}
+
+"t" is session time in milliseconds. replay() folds the events back into
+the session state, and Session.resume() rebuilds a session from that state.
+The rebuilt session has the same question order and pass queue, the same
+trial number and points, and the same session time left; time spent crashed
+doesn't count. A question that was open at the crash is shown again with
+its trial number. A correct answer whose survey wasn't given yet is not
+counted, because its Correct row only reaches the .csv with the survey.
+"""
+
+import glob
+import json
+import os
+
+
+class JournalError(Exception):
+    """A journal that can't be resumed (missing, unreadable or finished)."""
+
+
+class SessionJournal:
+    """Append-only, fsynced JSONL log of one session's events."""
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.resumed = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, "a", encoding="utf-8")
+        if self.resumed and not _ends_with_newline(path):
+            self._file.write("\n") # Torn last line from the crash
+
+    def record(self, event, elapsed_ms, **fields):
+        if self._file.closed:
+            return
+        entry = {"e": event, "t": elapsed_ms}
+        entry.update(fields)
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_events(path):
+    """Events in a journal; a torn (unparseable) line is skipped."""
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+def replay(events):
+    """Session state after `events`, as a dict (see Session.resume())."""
+    if not events or events[0].get("e") != "start":
+        raise JournalError("journal doesn't start with a start event")
+    start = events[0]
+    state = {"subject": start["subject"], "condition": start["condition"],
+             "bank": start["bank"], "questions": list(start["questions"]),
+             "duration_ms": start["duration_ms"], "data_file": start["data_file"],
+             "timestamp": start["timestamp"],
+             "queue_pos": 0, "trial_number": 0, "passed": 0, "correct": 0,
+             "incorrect": 0, "points": 0, "elapsed_ms": 0, "current": None,
+             "finished": False, "ended": False}
+    correct_points = None # Points of a correct answer waiting for its survey
+    for event in events[1:]:
+        kind = event.get("e")
+        state["elapsed_ms"] = max(state["elapsed_ms"], event.get("t", 0))
+        if kind == "question":
+            state["queue_pos"] += 1
+            state["trial_number"] += 1
+            state["current"] = event["q"]
+            correct_points = None
+        elif kind == "response":
+            if event["a"] == "Incorrect":
+                state["incorrect"] += 1
+                state["points"] += event["p"]
+            elif event["a"] == "Correct":
+                correct_points = event["p"]
+        elif kind == "pass":
+            state["passed"] += 1
+            state["points"] += event["p"]
+            state["questions"].append(state["current"])
+            state["current"] = None
+        elif kind == "survey":
+            state["correct"] += 1
+            state["points"] += correct_points or 0
+            state["current"], correct_points = None, None
+        elif kind == "timer":
+            state["finished"] = True
+        elif kind == "end":
+            state["ended"] = True
+    if state["current"] is not None:
+        # Open question at the crash: next_question() serves it again
+        state["queue_pos"] -= 1
+        state["trial_number"] -= 1
+        state["current"] = None
+    return state
+
+
+def journal_path(data_folder, timestamp):
+    return os.path.join(data_folder, f"H008b_journal_{timestamp}.jsonl")
+
+
+def find_journal(data_folder, session):
+    """Journal for `session`: a path, or (part of) a session timestamp."""
+    if os.path.isfile(session):
+        return session
+    matches = sorted(glob.glob(os.path.join(data_folder, f"H008b_journal_*{glob.escape(session)}*.jsonl")))
+    if len(matches) != 1:
+        found = ", ".join(os.path.basename(m) for m in matches) or "none"
+        raise JournalError(f"Expected one journal matching {session!r} in {data_folder} (found: {found})")
+    return matches[0]
@@ -0,0 +1,159 @@
+"""
+Deterministic local grading.
+
+A good share of responses can be decided without asking the LLM: the exact
+answer typed in ("13112221", "day 59", "every year"), a number that is or
+isn't the right one, or one of the incorrect answers we already listed in
+`possible_incorrect_solution`. LocalGrader checks a response against those
+rules and returns an evaluation in the same format the LLM gives back:
+
+    "yes"                       -> correct
+    "<feedback sentence> <1-4>" -> incorrect, parsed by the runner like a
+                                   GPT evaluation (grade is the last char)
+    None                        -> not confident; ask the LLM
+
+Rules for a question come from two places. Correct and known-incorrect
+answers are pulled out of the question's own `insight_answer`,
+`possible_incorrect_solution` and `possible_incorrect_feedback` strings.
+Anything that needs more than an exact match (numbers, regexes, equations)
+goes in a per-question rule dict:
+
+    "water_lily_problem" : {
+        "numeric_answer"    : 59,           # "59", "day 59", "the 59th day"
+        "correct_patterns"  : [r"..."],     # regexes on the normalized text
+        "equation_digits"   : "2345",       # listed equations, either side first
+        "incorrect_grade"   : 2,            # grade given to known-wrong answers
+        "incorrect_answers" : {"30" : "feedback"},
+        }
+"""
+
+import re
+
+# Grade given to answers we already listed as typical incorrect solutions
+DEFAULT_INCORRECT_GRADE = 2
+
+NUMBER_WORDS = {
+    "zero": 0, "none": 0, "one": 1, "two": 2, "three": 3, "four": 4,
+    "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    }
+
+# Words that can sit around a bare number without changing the answer
+# ("on the 59th day", "it's 3", "3 socks")
+NUMERIC_FILLER = {"on", "the", "day", "days", "it", "its", "is", "was",
+                  "answer", "you", "need", "socks", "sock", "people",
+                  "of", "them", "would", "have", "be", "by", "about"}
+
+_QUOTED_ANSWER = re.compile(r"'(.*?)'(?=\s*(?:or\b|,|\.|$))", re.DOTALL)
+_ORDINAL = re.compile(r"^(\d+)(st|nd|rd|th)$")
+
+
+def normalize_response(text):
+    """Lower-case, drop quotes/punctuation and collapse whitespace.
+
+    Operators used in the equation problems (= + - ^ * /) are kept, with
+    the spaces around them removed, so "X - IV = VI" == "x-iv=vi".
+    """
+    text = text.casefold().strip()
+    text = text.replace("’", "").replace("'", "").replace("×", "x")
+    text = re.sub(r"[^\w\s=+\-^*/≠]", " ", text)
+    text = re.sub(r"\s*([=+\-^*/≠])\s*", r"\1", text)
+    return " ".join(text.split())
+
+
+def split_listed_answers(text):
+    """Split "'a' or 'b' or 'c', respectively" into ['a', 'b', 'c']."""
+    answers = [a.strip() for a in _QUOTED_ANSWER.findall(text.strip())]
+    return [a.rstrip(",").strip() for a in answers if a.strip(" ,")]
+
+
+class LocalGrader:
+    """Rule-based grader that answers only when it is sure."""
+
+    def __init__(self, question_info, rules=None):
+        self.question_info = question_info
+        self.rules = rules or {}
+        # Precompute the normalized lookup tables once per question
+        self._correct = {}
+        self._incorrect = {}
+        self._patterns = {}
+        self._equations = {}
+        for shorthand, info in question_info.items():
+            rule = self.rules.get(shorthand, {})
+            self._correct[shorthand] = {
+                normalize_response(a) for a in split_listed_answers(info["insight_answer"])
+                }
+            grade = rule.get("incorrect_grade", DEFAULT_INCORRECT_GRADE)
+            wrong = split_listed_answers(info["possible_incorrect_solution"])
+            feedback = split_listed_answers(info["possible_incorrect_feedback"])
+            known = {}
+            # The two lists are paired "respectively"; if they don't line up
+            # one-to-one we can't tell which feedback goes with which answer,
+            # so those answers are left to the LLM
+            if len(wrong) == len(feedback):
+                for answer, fb in zip(wrong, feedback):
+                    known[normalize_response(answer)] = (fb, grade)
+            for answer, fb in rule.get("incorrect_answers", {}).items():
+                known[normalize_response(answer)] = (fb, grade)
+            self._incorrect[shorthand] = known
+            self._patterns[shorthand] = [re.compile(p) for p in rule.get("correct_patterns", [])]
+            if "equation_digits" in rule:
+                # Only the listed equations (either side first); any other
+                # equation, even a true one, may break the question's
+                # constraints, so it goes to the LLM
+                forms = set()
+                for answer in split_listed_answers(info["insight_answer"]):
+                    left, _, right = self._equation_form(normalize_response(answer)).partition("=")
+                    forms.update({f"{left}={right}", f"{right}={left}"})
+                self._equations[shorthand] = forms
+
+    def evaluate(self, shorthand, response):
+        """Return "yes", "<feedback> <grade>", or None if not confident."""
+        if shorthand not in self.question_info:
+            return None
+        norm = normalize_response(response)
+        if not norm:
+            return None
+        if norm in self._correct[shorthand]:
+            return "yes"
+        if any(p.search(norm) for p in self._patterns[shorthand]):
+            return "yes"
+        if norm in self._incorrect[shorthand]:
+            feedback, grade = self._incorrect[shorthand][norm]
+            return f"{feedback} {grade}"
+
+        rule = self.rules.get(shorthand, {})
+        if "numeric_answer" in rule:
+            number = self._bare_number(norm)
+            if number is not None and number == rule["numeric_answer"]:
+                return "yes"
+            if number is not None:
+                # A known-wrong number written another way ("day 30")
+                wrong = self._incorrect[shorthand].get(str(number))
+                if wrong is not None:
+                    return f"{wrong[0]} {wrong[1]}"
+        if self._equation_form(norm) in self._equations.get(shorthand, ()):
+            return "yes"
+        return None
+
+    @staticmethod
+    def _bare_number(norm):
+        """The single number in a short numeric answer, else None."""
+        numbers = []
+        for word in norm.split():
+            if word in NUMERIC_FILLER:
+                continue
+            ordinal = _ORDINAL.match(word)
+            if word.isdecimal(): # Not isdigit(): "²" is a digit but int() rejects it
+                numbers.append(int(word))
+            elif ordinal:
+                numbers.append(int(ordinal.group(1)))
+            elif word in NUMBER_WORDS:
+                numbers.append(NUMBER_WORDS[word])
+            else:
+                return None # Some other word; let the LLM judge it
+        return numbers[0] if len(numbers) == 1 else None
+
+    @staticmethod
+    def _equation_form(norm):
+        """An equation with spaces dropped and * written as x ("2 * 4=3+5" -> "2x4=3+5")."""
+        return norm.replace(" ", "").replace("*", "x")
@@ -0,0 +1,309 @@
+"""
+Local mock of the OpenAI chat-completions API for offline load testing.
+
+Speaks enough of the wire format for the runner's OpenAI client
+(POST /v1/chat/completions, GET /v1/models) and grades with rules instead
+of a model: the local matcher decides what it can, everything else gets a
+canned feedback sentence ending in a 1-4 grade -- the same "feedback +
+trailing digit" format the runner parses from GPT.
+
+Latency, error rate and rate limits can be injected to see how the runner
+behaves when the API is slow or unhappy. Requests with "stream": true get
+the reply as server-sent chat.completion.chunk events, one word at a time
+(--token-delay seconds apart). Requests with a JSON response_format get the
+structured {"verdict", "grade", "hint"} reply (see
+h008b/structured_grading.py); --malformed-rate garbles some of those.
+
+Usage:
+    python -m h008b.mock_server --port 8008 --latency uniform:0.3,1.5 \\
+        --error-rate 0.02 --rate-limit 20
+
+then point the runner at it, e.g.
+    H008B_GPT_BASE_URL=http://127.0.0.1:8008/v1 python H008b_Caffeine_and_Insight_ExpProgram.py
+"""
+
+import argparse
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+from time import sleep, time
+
+from h008b.grading import build_grading_prompt
+from h008b.local_grading import LocalGrader
+from h008b.questions import dict_of_question_info, dict_of_local_grading_rules
+
+CANNED_FEEDBACK = [
+    "That answer doesn't solve the problem yet, try looking at it from a different angle",
+    "Not quite, think about what the problem is really asking",
+    "You're on a path, but something important is still missing from your answer",
+    ]
+
+_ANSWER = re.compile(r"Here is the solution to evaluate: '(.*)'\.?\s*$", re.DOTALL)
+_NUMBERED_ANSWER = re.compile(r"^(\d+): '(.*)'$", re.MULTILINE)
+
+
+def parse_latency(spec):
+    """'fixed:0.2' / 'uniform:a,b' / 'lognormal:mu,sigma' -> sampler(rng)."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise argparse.ArgumentTypeError(f"Bad latency spec {spec!r}")
+
+
+def message_text(message):
+    """Text of a chat message whose content is a string or a list of parts."""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class MockGrader:
+    """Rule-based stand-in for the grading model."""
+
+    def __init__(self, seed=0):
+        self.local_grader = LocalGrader(dict_of_question_info, dict_of_local_grading_rules)
+        self._prompts = {build_grading_prompt(info).strip(): shorthand
+                         for shorthand, info in dict_of_question_info.items()}
+        self._rng = Random(seed)
+        self._lock = threading.Lock()
+
+    def identify(self, messages):
+        """(question shorthand or None, participant answer) from a request."""
+        text = "\n".join(message_text(m) for m in messages)
+        shorthand = next((q for p, q in self._prompts.items() if p in text), None)
+        # The answer is in the last message that carries one (a re-ask adds more turns)
+        matches = (_ANSWER.search(message_text(m)) for m in reversed(messages))
+        match = next((m for m in matches if m), None)
+        answer = match.group(1) if match else message_text(messages[-1]) if messages else ""
+        return shorthand, answer
+
+    def evaluate(self, messages):
+        shorthand, answer = self.identify(messages)
+        text = "\n".join(message_text(m) for m in messages)
+        if "solutions from different subjects" in text:
+            # Multi-answer request (see OpenAIEvaluator.evaluate_many)
+            return "\n".join(f"{n}: {self.evaluate_one(shorthand, a)}"
+                             for n, a in _NUMBERED_ANSWER.findall(text))
+        return self.evaluate_one(shorthand, answer)
+
+    @staticmethod
+    def structured(evaluation):
+        """Evaluation string -> the JSON reply StructuredEvaluator asks for."""
+        if evaluation.lower() == "yes":
+            return json.dumps({"verdict": "correct", "grade": None, "hint": ""})
+        return json.dumps({"verdict": "incorrect", "grade": int(evaluation[-1]),
+                           "hint": evaluation[:-2].strip()})
+
+    def evaluate_one(self, shorthand, answer):
+        evaluation = self.local_grader.evaluate(shorthand, answer) if shorthand else None
+        if evaluation is not None:
+            return evaluation
+        with self._lock:
+            feedback = self._rng.choice(CANNED_FEEDBACK)
+            grade = self._rng.randint(1, 4)
+        return f"{feedback}. {grade}"
+
+
+class MockSettings:
+    """Knobs shared by all request handlers."""
+
+    def __init__(self, latency, error_rate=0.0, rate_limit=None, seed=0, token_delay=0.0,
+                 malformed_rate=0.0):
+        self.latency = latency
+        self.token_delay = token_delay # seconds between streamed pieces
+        self.malformed_rate = malformed_rate # fraction of JSON replies sent garbled
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit # requests per second, None = unlimited
+        self.grader = MockGrader(seed)
+        self.rng = Random(seed + 1)
+        self.lock = threading.Lock()
+        self._tokens = rate_limit or 0
+        self._last_refill = time()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0,
+                         "malformed": 0}
+
+    def take_token(self):
+        """Token bucket: False if this request is over the rate limit."""
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time()
+            self._tokens = min(self.rate_limit,
+                               self._tokens + (now - self._last_refill) * self.rate_limit)
+            self._last_refill = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    settings = None # set by make_server()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass # Keep the console quiet under load
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message, kind, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": kind,
+                                           "param": None, "code": None}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "mock-grader", "object": "model", "created": 0, "owned_by": "h008b"}]})
+        else:
+            self._error(404, "Not found", "invalid_request_error")
+
+    def do_POST(self):
+        settings = self.settings
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._error(400, "Request body is not valid JSON", "invalid_request_error")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._error(404, "Not found", "invalid_request_error")
+        settings.count("requests")
+
+        if not settings.take_token():
+            settings.count("rate_limited")
+            return self._error(429, "Rate limit reached for mock-grader", "rate_limit_error",
+                               {"Retry-After": "1"})
+        with settings.lock:
+            delay = max(0.0, settings.latency(settings.rng))
+            fail = settings.rng.random() < settings.error_rate
+        sleep(delay)
+        if fail:
+            settings.count("errors")
+            return self._error(500, "The mock server had an injected error", "server_error")
+
+        messages = request.get("messages", [])
+        content = settings.grader.evaluate(messages)
+        if (request.get("response_format") or {}).get("type") in ("json_schema", "json_object"):
+            content = settings.grader.structured(content)
+            with settings.lock:
+                garble = settings.rng.random() < settings.malformed_rate
+            if garble:
+                settings.count("malformed")
+                content = content[:-1] # Unterminated object
+        settings.count("ok")
+        if request.get("stream"):
+            return self._send_stream(request, content)
+        prompt_tokens = sum(len(message_text(m).split()) for m in messages)
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time()),
+            "model": request.get("model", "mock-grader"),
+            "choices": [{"index": 0,
+                         "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens,
+                      "completion_tokens": len(content.split()),
+                      "total_tokens": prompt_tokens + len(content.split())},
+            })
+
+    def _send_stream(self, request, content):
+        # Server-sent events, one chunk per word, sent with chunked transfer
+        # encoding like the real API, so the connection stays open afterwards
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion.chunk",
+                "created": int(time()),
+                "model": request.get("model", "mock-grader")}
+        pieces = re.findall(r"\S+\s*|\s+", content)
+        deltas = [{"role": "assistant", "content": ""}] + [{"content": p} for p in pieces]
+        for n, delta in enumerate(deltas):
+            if n > 1 and self.settings.token_delay:
+                sleep(self.settings.token_delay)
+            event = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+            self._write_chunk(f"data: {json.dumps(event)}\n\n")
+        event = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        # Last event and end of body in one write: clients may hang up at [DONE]
+        self._write_chunk(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n", last=True)
+
+    def _write_chunk(self, text, last=False):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n"
+                         + (b"0\r\n\r\n" if last else b""))
+        self.wfile.flush()
+
+def make_server(host="127.0.0.1", port=8008, latency="fixed:0", error_rate=0.0,
+                rate_limit=None, seed=0, token_delay=0.0, malformed_rate=0.0):
+    """Build (but don't start) a mock server; port=0 picks a free port."""
+    if isinstance(latency, str):
+        latency = parse_latency(latency)
+    settings = MockSettings(latency, error_rate, rate_limit, seed, token_delay, malformed_rate)
+    handler = type("BoundMockHandler", (MockHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a mock server on a daemon thread; returns (server, base_url)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock OpenAI grading server for H008b.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency", default="fixed:0", type=parse_latency, metavar="SPEC",
+                        help="response delay, e.g. fixed:0.5, uniform:0.2,1.5, lognormal:-0.5,0.6")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="requests per second before answering HTTP 429")
+    parser.add_argument("--token-delay", type=float, default=0.0,
+                        help="seconds between pieces of a streamed reply (default 0)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="fraction of JSON-format replies sent with a schema error")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.latency, args.error_rate,
+                         args.rate_limit, args.seed, args.token_delay, args.malformed_rate)
+    print(f"Mock grading server on http://{args.host}:{server.server_address[1]}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.RequestHandlerClass.settings.counters))
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Question order generation.
+
+Questions are shown so that no more than two of the same problem_type come
+in a row. The order used to be found by shuffling the bank until a shuffle
+happened to pass. That loop has no bound: it slows down as banks grow and
+never returns for a bank that can't be ordered (e.g. five VERBAL and one
+SPATIAL question).
+
+BankOrders builds valid orders directly instead. A valid order is a
+sequence of problem types with no over-long run (the type pattern), filled
+in with some ordering of each type's questions. BankOrders counts the
+valid type patterns once per bank, with a small table over (questions left
+of each type, last type, run length). From those counts it can:
+
+    sample(rng)        draw an order uniformly from all valid orders
+    order(index)       the index-th valid order, 0 <= index < len(orders)
+    counterbalanced(n, seed)
+                       the order for subject number n: over any len(orders)
+                       consecutive subject numbers, every valid order is
+                       used exactly once
+
+None of these list the permutations. The counts table grows with the
+product of the per-type question counts, not with the number of orders.
+For banks where even that is too big (more than MAX_STATES entries),
+orders are built one question at a time instead. Each step picks a type
+that can still be completed without a long run, weighted by how many of
+its questions are left. That takes linear time but isn't exactly uniform,
+and order()/len() aren't available; counterbalanced() then falls back to a
+sample seeded by (seed, n).
+
+Seeds make the orders reproducible:
+
+    orders = bank_orders(dict_of_question_banks["1"], dict_of_question_info)
+    orders.sample(Random(42))
+    orders.counterbalanced(17, seed="H008b")
+"""
+
+from functools import lru_cache
+from hashlib import sha256
+from math import factorial, gcd
+from random import Random
+
+MAX_RUN = 2 # Max questions of one problem_type in a row
+MAX_STATES = 50000 # Largest counts table built for exact counting
+
+
+class OrderingError(ValueError):
+    """Raised when a bank has no order that meets the run constraint."""
+
+
+def subject_number(subject_ID):
+    """Trailing digits of a subject ID as an int ("S017" -> 17), or None."""
+    digits = ""
+    for c in reversed(str(subject_ID).strip()):
+        if not c.isdigit():
+            break
+        digits = c + digits
+    return int(digits) if digits else None
+
+
+class BankOrders:
+    """All orders of one bank with at most `max_run` same-type questions in a row."""
+
+    def __init__(self, questions, question_info, max_run=MAX_RUN, max_states=MAX_STATES):
+        self.max_run = max_run
+        by_type = {}
+        for q in questions:
+            by_type.setdefault(question_info[q]["problem_type"], []).append(q)
+        self.types = sorted(by_type)
+        self.by_type = [by_type[t] for t in self.types]
+        self._counts = tuple(len(qs) for qs in self.by_type)
+        if not self._feasible(self._counts, -1, 0):
+            raise OrderingError(
+                f"No order of {len(questions)} questions "
+                f"({', '.join(f'{n} {t}' for t, n in zip(self.types, self._counts))}) "
+                f"has at most {max_run} of a type in a row")
+        states = len(self.types) * max_run
+        for n in self._counts:
+            states *= n + 1
+        self.exact = states <= max_states
+        if not self.exact:
+            self.num_patterns = self.total = None
+            return
+        # Orderings of the questions within each type, for any one type pattern
+        self._fills = 1
+        for n in self._counts:
+            self._fills *= factorial(n)
+        self._patterns = lru_cache(maxsize=None)(self._count_patterns)
+        self.num_patterns = self._patterns(self._counts, -1, 0)
+        self.total = self.num_patterns * self._fills
+
+    def __len__(self):
+        if not self.exact:
+            raise TypeError("Bank too large to count its orders")
+        return self.total
+
+    def _feasible(self, left, last, run):
+        # Whether `left` can still be placed after `run` of type `last`: no
+        # type may outnumber the runs the other types leave room for, and
+        # `last` only has max_run - run left in its current run
+        rest = sum(left)
+        for t, n in enumerate(left):
+            room = self.max_run * (rest - n + 1)
+            if t == last:
+                room -= run
+            if n > room:
+                return False
+        return True
+
+    def _count_patterns(self, left, last, run):
+        # Valid type patterns for the `left` questions still to place, after
+        # `run` questions of type `last` in a row
+        if not any(left):
+            return 1
+        total = 0
+        for t, n in enumerate(left):
+            if n and (t != last or run < self.max_run):
+                total += self._patterns(self._take(left, t), t, run + 1 if t == last else 1)
+        return total
+
+    @staticmethod
+    def _take(left, t):
+        return left[:t] + (left[t] - 1,) + left[t + 1:]
+
+    def _pattern(self, rank):
+        """The rank-th valid type pattern (types in sorted order at each step)."""
+        left, last, run, pattern = self._counts, -1, 0, []
+        while any(left):
+            for t, n in enumerate(left):
+                if not n or (t == last and run >= self.max_run):
+                    continue
+                next_run = run + 1 if t == last else 1
+                count = self._patterns(self._take(left, t), t, next_run)
+                if rank < count:
+                    pattern.append(t)
+                    left, last, run = self._take(left, t), t, next_run
+                    break
+                rank -= count
+        return pattern
+
+    def _fill(self, pattern, rank):
+        """Put questions in the type slots of `pattern`, the rank-th way."""
+        queues = []
+        for qs in self.by_type:
+            # Mixed radix: one permutation rank per type, unranked by Lehmer code
+            rank, perm_rank = divmod(rank, factorial(len(qs)))
+            pool, perm = list(qs), []
+            for i in range(len(qs), 0, -1):
+                j, perm_rank = divmod(perm_rank, factorial(i - 1))
+                perm.append(pool.pop(j))
+            queues.append(iter(perm))
+        return [next(queues[t]) for t in pattern]
+
+    def _build(self, rng):
+        """An order built step by step (for banks too large to count)."""
+        left, last, run, pattern = self._counts, -1, 0, []
+        while any(left):
+            options, weights = [], []
+            for t, n in enumerate(left):
+                if not n or (t == last and run >= self.max_run):
+                    continue
+                next_run = run + 1 if t == last else 1
+                if self._feasible(self._take(left, t), t, next_run):
+                    options.append(t)
+                    weights.append(n)
+            t = rng.choices(options, weights)[0]
+            run = run + 1 if t == last else 1
+            left, last = self._take(left, t), t
+            pattern.append(t)
+        queues = []
+        for qs in self.by_type:
+            qs = list(qs)
+            rng.shuffle(qs)
+            queues.append(iter(qs))
+        return [next(queues[t]) for t in pattern]
+
+    def order(self, index):
+        """The index-th valid order."""
+        if not self.exact:
+            raise OrderingError("Bank too large to index its orders; use sample()")
+        if not 0 <= index < self.total:
+            raise IndexError(f"Order {index} out of range (bank has {self.total} orders)")
+        pattern_rank, fill_rank = divmod(index, self._fills)
+        return self._fill(self._pattern(pattern_rank), fill_rank)
+
+    def sample(self, rng=None):
+        """A valid order drawn at random (uniformly, for exact banks)."""
+        rng = rng or Random()
+        if not self.exact:
+            return self._build(rng)
+        return self.order(rng.randrange(self.total))
+
+    def counterbalanced(self, n, seed=None):
+        """The order for the n-th subject.
+
+        Subject numbers step through the orders with a seeded stride that is
+        coprime to the number of orders, so n, n+1, ... n+len(self)-1 get
+        every order once, and neighbouring subject numbers get unrelated
+        orders rather than near-identical ones. Because questions of one type
+        are interchangeable in the constraint, each question of a type is in
+        each of that type's positions equally often over such a block.
+        """
+        if not self.exact:
+            return self._build(Random(f"{seed}|{n}"))
+        offset, stride = self._walk(seed)
+        return self.order((offset + n * stride) % self.total)
+
+    def _walk(self, seed):
+        digest = sha256(f"{seed}|{'|'.join(map(str, self.by_type))}".encode()).digest()
+        offset = int.from_bytes(digest[:8], "big") % self.total
+        stride = int.from_bytes(digest[8:16], "big") % self.total or 1
+        while gcd(stride, self.total) != 1:
+            stride += 1
+        return offset, stride
+
+
+@lru_cache(maxsize=None)
+def _bank_orders(questions, types, max_run):
+    info = {q: {"problem_type": t} for q, t in zip(questions, types)}
+    return BankOrders(questions, info, max_run)
+
+
+def bank_orders(questions, question_info, max_run=MAX_RUN):
+    """BankOrders for a bank, built once per process and shared by all sessions."""
+    questions = tuple(questions)
+    types = tuple(question_info[q]["problem_type"] for q in questions)
+    return _bank_orders(questions, types, max_run)
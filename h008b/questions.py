@@ -0,0 +1,160 @@
+"""
+Insight problems used in H008b.
+
+Each problem has the question text, the expected answer, typical incorrect
+solutions with matching feedback (used both in the GPT prompt and by the
+local grader) and its problem type. Problems are split into three banks of
+six; each subject sees a different bank in each session of the ABA/BAB
+design.
+
+They used to be Python literals, copied from script to script (H008a, the
+PILOT, H008b). They now live in one JSON file, h008b/questions.json:
+
+    {"questions": {"<shorthand>": {"insight_question": ..., "insight_answer": ...,
+                                   "possible_incorrect_solution": ...,
+                                   "possible_incorrect_feedback": ...,
+                                   "problem_type": "VERBAL", "difficulty": 2}, ...},
+     "banks": {"1": ["<shorthand>", ...], ...},
+     "local_grading_rules": {"<shorthand>": {...}, ...}}
+
+"difficulty" is optional. Banks can have any number of questions, and there
+can be any number of banks. Adding problems or banks means editing the
+JSON, not the code.
+
+QuestionCatalog loads the file once per process, checks it, and builds
+its indexes in one pass: questions by type, by bank and by difficulty, the
+bank of each question, and each bank's position map (question ->
+"1".."n"). Set H008B_QUESTION_CATALOG to run the experiment from another
+catalog file. `python -m h008b.catalog` checks a catalog (see
+h008b/catalog.py).
+"""
+
+import json
+import os
+from functools import lru_cache
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+CATALOG_ENV = "H008B_QUESTION_CATALOG"
+REQUIRED_FIELDS = ("insight_question", "insight_answer", "problem_type")
+
+
+class CatalogError(ValueError):
+    """Raised for a catalog file that is malformed or inconsistent."""
+
+
+class QuestionCatalog:
+    """Questions, banks and grading rules, indexed for lookup."""
+
+    def __init__(self, questions, banks, grading_rules=None, path=None):
+        self.path = path
+        self.questions = questions
+        self.banks = {str(b): list(qs) for b, qs in banks.items()}
+        self.grading_rules = grading_rules or {}
+
+        by_type, by_difficulty, bank_of = {}, {}, {}
+        for shorthand, info in questions.items():
+            missing = [f for f in REQUIRED_FIELDS if f not in info]
+            if missing:
+                raise CatalogError(f"{shorthand}: missing {', '.join(missing)}")
+            by_type.setdefault(info["problem_type"], []).append(shorthand)
+            if info.get("difficulty") is not None:
+                by_difficulty.setdefault(info["difficulty"], []).append(shorthand)
+        for bank, qs in self.banks.items():
+            for shorthand in qs:
+                if shorthand not in questions:
+                    raise CatalogError(f"Bank {bank}: unknown question {shorthand!r}")
+                if shorthand in bank_of:
+                    # Each session uses a different bank; a shared question would be seen twice
+                    raise CatalogError(f"{shorthand} is in bank {bank_of[shorthand]} and bank {bank}")
+                bank_of[shorthand] = bank
+        unknown = set(self.grading_rules) - set(questions)
+        if unknown:
+            raise CatalogError(f"Grading rules for unknown questions: {', '.join(sorted(unknown))}")
+
+        self.by_type = {t: tuple(qs) for t, qs in by_type.items()}
+        self.by_difficulty = {d: tuple(qs) for d, qs in by_difficulty.items()}
+        self.by_bank = {b: tuple(qs) for b, qs in self.banks.items()}
+        self.bank_of = bank_of
+        self.positions = {b: {q: str(i + 1) for i, q in enumerate(qs)}
+                          for b, qs in self.banks.items()}
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, shorthand):
+        return shorthand in self.questions
+
+    def select(self, problem_type=None, bank=None, difficulty=None):
+        """Shorthands matching all the given criteria, in catalog order."""
+        pools = []
+        if problem_type is not None:
+            pools.append(self.by_type.get(problem_type, ()))
+        if bank is not None:
+            pools.append(self.by_bank.get(str(bank), ()))
+        if difficulty is not None:
+            pools.append(self.by_difficulty.get(difficulty, ()))
+        if not pools:
+            return tuple(self.questions)
+        keep = set(pools[0]).intersection(*pools[1:])
+        return tuple(q for q in self.questions if q in keep)
+
+    def bank_choices(self):
+        """Bank names for setup prompts: "1-3" for consecutive numbers, else "1, 2, x"."""
+        names = list(self.banks)
+        if all(n.isdigit() for n in names) and len(names) > 1:
+            numbers = sorted(int(n) for n in names)
+            if numbers == list(range(numbers[0], numbers[-1] + 1)):
+                return f"{numbers[0]}-{numbers[-1]}"
+        return ", ".join(names)
+
+    def to_json(self):
+        return {"questions": self.questions, "banks": self.banks,
+                "local_grading_rules": self.grading_rules}
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        os.replace(tmp, path)
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise CatalogError(f"{path}: {e}") from None
+        if not isinstance(data, dict) or "questions" not in data or "banks" not in data:
+            raise CatalogError(f"{path}: expected an object with 'questions' and 'banks'")
+        return cls(data["questions"], data["banks"], data.get("local_grading_rules"), path=path)
+
+
+@lru_cache(maxsize=None)
+def _load(path, mtime_ns, size):
+    return QuestionCatalog.from_file(path)
+
+
+def load_catalog(path=None):
+    """The catalog at `path` (default: $H008B_QUESTION_CATALOG or questions.json).
+
+    Parsed once per process; loaded again only if the file changes.
+    """
+    path = os.path.abspath(path or os.environ.get(CATALOG_ENV) or DEFAULT_CATALOG)
+    st = os.stat(path)
+    return _load(path, st.st_mtime_ns, st.st_size)
+
+
+
+catalog = load_catalog()
+
+# Setup insight questions
+dict_of_question_info = catalog.questions
+
+# Split questions into banks
+dict_of_question_banks = catalog.banks
+
+# Extra rules for the local (non-LLM) grader. Exact correct answers and the
+# known incorrect answers are already read out of dict_of_question_info;
+# these cover numbers, patterns and equations. See h008b/local_grading.py.
+dict_of_local_grading_rules = catalog.grading_rules
@@ -0,0 +1,154 @@
+"""
+Line input that can see the participant typing.
+
+read_line() is a stand-in for input() that reads the terminal a key at a
+time (cbreak mode on POSIX, msvcrt on Windows) and calls on_pause(draft)
+when typing stops for `pause` seconds with a changed draft -- that's when
+the runner sends the draft for speculative grading (h008b/speculative.py).
+
+Editing is kept to what a participant needs: typing, backspace, Ctrl+U to
+clear the line, enter to submit. Arrow keys and other escape sequences are
+ignored. When stdin isn't a terminal it falls back to plain input().
+"""
+
+import os
+import sys
+from time import sleep, time
+
+try:
+    import termios
+    import tty
+    import select
+except ImportError: # Windows
+    termios = None
+try:
+    import msvcrt
+except ImportError: # POSIX
+    msvcrt = None
+
+BACKSPACE = ("\x7f", "\x08")
+CLEAR_LINE = "\x15" # Ctrl+U
+
+
+class _LineEditor:
+    """The draft being typed; echoes its own edits."""
+
+    def __init__(self, write):
+        self.chars = []
+        self.write = write
+
+    @property
+    def text(self):
+        return "".join(self.chars)
+
+    def key(self, ch):
+        """Apply one key; returns True on enter."""
+        if ch in ("\r", "\n"):
+            self.write("\n")
+            return True
+        if ch in BACKSPACE:
+            if self.chars:
+                self.chars.pop()
+                self.write("\b \b")
+        elif ch == CLEAR_LINE:
+            self.write("\b \b" * len(self.chars))
+            self.chars = []
+        elif ch == "\x03":
+            raise KeyboardInterrupt
+        elif ch == "\x04" and not self.chars:
+            raise EOFError
+        elif ch.isprintable():
+            self.chars.append(ch)
+            self.write(ch)
+        return False
+
+
+def _echo(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def read_line(prompt="", on_pause=None, pause=0.6, on_first_key=None):
+    """input(prompt), calling on_pause(draft) whenever typing pauses.
+
+    on_first_key() is called once, at the first keystroke (not available
+    when stdin isn't a terminal).
+    """
+    if not sys.stdin.isatty() or (termios is None and msvcrt is None):
+        return input(prompt)
+    _echo(prompt)
+    editor = _LineEditor(_echo)
+    watch = _PauseWatch(on_pause, pause, on_first_key)
+    if termios is not None:
+        return _read_posix(editor, watch)
+    return _read_windows(editor, watch)
+
+
+class _PauseWatch:
+    """Fires on_pause once per distinct draft after `pause` quiet seconds."""
+
+    def __init__(self, on_pause, pause, on_first_key=None):
+        self.on_pause = on_pause
+        self.pause = pause
+        self.on_first_key = on_first_key
+        self.last_key = time()
+        self.last_draft = ""
+
+    def typed(self):
+        self.last_key = time()
+        if self.on_first_key is not None:
+            on_first_key, self.on_first_key = self.on_first_key, None
+            on_first_key()
+
+    def timeout(self):
+        return max(0.0, self.pause - (time() - self.last_key))
+
+    def check(self, draft):
+        if (self.on_pause is not None and draft.strip() and draft != self.last_draft
+                and time() - self.last_key >= self.pause):
+            self.last_draft = draft
+            self.on_pause(draft)
+
+
+def _read_posix(editor, watch):
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd) # Keys one at a time, no echo; Ctrl+C still works
+        pending = b""
+        while True:
+            ready, _, _ = select.select([fd], [], [], watch.timeout() or watch.pause)
+            if not ready:
+                watch.check(editor.text)
+                continue
+            data = os.read(fd, 1024)
+            if not data:
+                raise EOFError
+            watch.typed()
+            if data.startswith(b"\x1b"):
+                continue # Arrow/function keys
+            pending += data
+            try:
+                text, pending = pending.decode("utf-8"), b""
+            except UnicodeDecodeError:
+                continue # Partial multi-byte character; wait for the rest
+            for ch in text:
+                if editor.key(ch):
+                    return editor.text
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+
+def _read_windows(editor, watch):
+    while True:
+        if not msvcrt.kbhit():
+            watch.check(editor.text)
+            sleep(0.02)
+            continue
+        ch = msvcrt.getwch()
+        watch.typed()
+        if ch in ("\x00", "\xe0"):
+            msvcrt.getwch() # Second half of an arrow/function key
+            continue
+        if editor.key(ch):
+            return editor.text
@@ -0,0 +1,294 @@
+"""
+Offline regrading of collected sessions.
+
+The Grade and GPT_Hint columns are fixed when a session is run. To see how a
+new prompt or model would have scored past sessions, this streams every
+data/H008b_output_data_*.csv and data/H008a_output_data_*.csv, regrades
+each graded Solution (Correct/Incorrect rows) with the current grading
+pipeline and writes a side-by-side table of old and new grades.
+
+    - Rows go through a bounded pool of grading workers; requests for the
+      same question are coalesced into multi-answer requests (see
+      h008b/batching.py), and an answer repeated across files is graded once.
+    - Every finished row is appended to a checkpoint file straight away, so
+      an interrupted run picks up where it stopped (--resume).
+    - H008a rows are graded with H008a's own question wording, read from
+      the H008a runner script.
+
+Usage (from the repository root):
+    python -m h008b.regrade --model gpt-4.1 --workers 16
+    python -m h008b.regrade --mock --resume          # offline, built-in mock grader
+    python -m h008b.regrade --prompt-file new_prompt.txt --out data/regrade_new_prompt
+
+Output (in --out, default data/regrade):
+    regrade_checkpoint.jsonl   one line per regraded row (used by --resume)
+    regrade_comparison.csv     old vs new accuracy/grade/hint for every row
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import threading
+from collections import Counter
+from time import time
+
+from h008b.grading import GRADING_PROMPT_TEMPLATE, REVIEW_EVALUATION, split_evaluation
+from h008b.catalog import script_literals
+from h008b.questions import dict_of_question_info
+
+H008A_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "H008a", "H008a_Caffeine_and_Insight_ExpProgram.py")
+DEFAULT_PATTERNS = ["H008b_output_data_*.csv", "H008a_output_data_*.csv"]
+GRADED_ROWS = ("Correct", "Incorrect")
+
+COMPARISON_HEADER = ["File", "Study", "Row", "Subject_ID", "Question", "Solution",
+                     "OldAccuracy", "OldGrade", "OldHint",
+                     "NewAccuracy", "NewGrade", "NewHint", "NewSource",
+                     "AccuracyChanged", "GradeChanged"]
+
+
+def load_script_questions(path):
+    """dict_of_question_info from a runner script, without running it."""
+    found = script_literals(path, ("dict_of_question_info",))
+    if "dict_of_question_info" not in found:
+        raise ValueError(f"No dict_of_question_info in {path}")
+    return found["dict_of_question_info"]
+
+
+def study_of(file_name):
+    return "H008a" if os.path.basename(file_name).startswith("H008a") else "H008b"
+
+
+def iter_graded_rows(paths):
+    """(file, row number, row dict) for every Correct/Incorrect row, streamed."""
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                if row.get("Accuracy") in GRADED_ROWS and (row.get("Solution") or "").strip():
+                    yield path, number, row
+
+
+def row_key(path, number):
+    return f"{os.path.basename(path)}:{number}"
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class Checkpoint:
+    """Append-only JSONL of finished rows; reloaded on --resume."""
+
+    def __init__(self, path, resume):
+        self.path = path
+        self.done = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # Torn last line from an interrupted run
+                    self.done[entry["key"]] = entry
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if resume and self._file.tell() and not _ends_with_newline(path):
+            self._file.write("\n") # Don't glue the next entry onto a torn line
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self.done[entry["key"]] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Regrader:
+    """Feeds rows through a GradingWorker, at most `max_in_flight` at a time."""
+
+    def __init__(self, grading_worker, question_info, prompt_template=GRADING_PROMPT_TEMPLATE,
+                 max_in_flight=64):
+        self.grading_worker = grading_worker
+        self.question_info = question_info # {"H008a": {...}, "H008b": {...}}
+        self.prompt_template = prompt_template
+        self._prompts = {}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._answers = {} # (study, question, solution) -> GradingJob, graded once per run
+        self._unfinished = 0 # Rows sent whose result isn't in the checkpoint yet
+        self._finished = threading.Condition()
+        self.skipped = Counter()
+
+    def prompt(self, study, shorthand):
+        key = (study, shorthand)
+        if key not in self._prompts:
+            info = self.question_info[study][shorthand]
+            self._prompts[key] = self.prompt_template.format(
+                insight_question = info["insight_question"],
+                insight_answer = info["insight_answer"],
+                possible_incorrect_solution = info["possible_incorrect_solution"],
+                possible_incorrect_feedback = info["possible_incorrect_feedback"])
+        return self._prompts[key]
+
+    def run(self, rows, checkpoint, progress=None):
+        for path, number, row in rows:
+            key = row_key(path, number)
+            if key in checkpoint.done:
+                self.skipped["resumed"] += 1
+                continue
+            study, shorthand = study_of(path), row.get("Question", "")
+            if shorthand not in self.question_info[study]:
+                self.skipped["unknown question"] += 1
+                continue
+            solution = row["Solution"]
+            answer = (study, shorthand, solution.strip())
+            job = self._answers.get(answer)
+            if job is None:
+                self._slots.acquire() # Bounded: wait for a free slot before sending more
+                job = self.grading_worker.submit(self.prompt(study, shorthand), shorthand, solution)
+                job.future.add_done_callback(lambda _: self._slots.release())
+                self._answers[answer] = job
+            base = {"key": key, "file": os.path.basename(path), "study": study, "row": number,
+                    "subject": row.get("Subject_ID", "NA"), "question": shorthand,
+                    "solution": solution, "old_accuracy": row.get("Accuracy"),
+                    "old_grade": row.get("Grade", "NA"), "old_hint": row.get("GPT_Hint", "NA")}
+            with self._finished:
+                self._unfinished += 1
+            job.future.add_done_callback(
+                lambda future, base=base: self._finish(future, base, checkpoint, progress))
+        # Wait for the checkpoint writes too, not just the grades
+        with self._finished:
+            self._finished.wait_for(lambda: self._unfinished == 0)
+
+    def _finish(self, future, base, checkpoint, progress):
+        try:
+            try:
+                evaluation, source, _ = future.result()
+            except Exception as e:
+                evaluation, source = REVIEW_EVALUATION, f"error: {type(e).__name__}"
+            accuracy, grade, hint = split_evaluation(evaluation)
+            checkpoint.record(dict(base, new_accuracy=accuracy, new_grade=grade,
+                                   new_hint=hint, new_source=source))
+            if progress is not None:
+                progress()
+        finally:
+            with self._finished:
+                self._unfinished -= 1
+                self._finished.notify_all()
+
+
+def write_comparison(entries, path):
+    """The side-by-side table; returns summary counts."""
+    summary = Counter()
+    entries = sorted(entries, key=lambda e: (e["file"], e["row"]))
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(COMPARISON_HEADER)
+        for e in entries:
+            accuracy_changed = e["old_accuracy"] != e["new_accuracy"]
+            grade_changed = e["old_grade"] != e["new_grade"]
+            summary["rows"] += 1
+            summary["accuracy_changed"] += accuracy_changed
+            summary["grade_changed"] += grade_changed
+            summary[f"{e['old_accuracy']} -> {e['new_accuracy']}"] += 1
+            w.writerow([e["file"], e["study"], e["row"], e["subject"], e["question"],
+                        e["solution"], e["old_accuracy"], e["old_grade"], e["old_hint"],
+                        e["new_accuracy"], e["new_grade"], e["new_hint"], e["new_source"],
+                        "yes" if accuracy_changed else "no", "yes" if grade_changed else "no"])
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regrade collected H008a/H008b sessions.")
+    parser.add_argument("--data-folder", default=os.path.join(os.getcwd(), "data"))
+    parser.add_argument("--pattern", action="append", default=None,
+                        help="file glob(s) in --data-folder (default: H008b and H008a output files)")
+    parser.add_argument("--out", default=None, help="output folder (default DATA_FOLDER/regrade)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rows already in the checkpoint from an earlier run")
+    parser.add_argument("--model", default="gpt-4.1")
+    parser.add_argument("--cheap-model", default=None,
+                        help="route through this model first (see h008b/routing.py)")
+    parser.add_argument("--base-url", default=os.environ.get("H008B_GPT_BASE_URL"))
+    parser.add_argument("--mock", action="store_true",
+                        help="start the built-in mock grading server and use it")
+    parser.add_argument("--structured", action="store_true", help="JSON grading replies")
+    parser.add_argument("--prompt-file", default=None,
+                        help="grading prompt template (same {placeholders} as the built-in one)")
+    parser.add_argument("--workers", type=int, default=16,
+                        help="GPT requests in flight at once (default 16)")
+    parser.add_argument("--no-local-grading", action="store_true",
+                        help="send every answer to the model, even clear-cut ones")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="don't reuse grades from the grading cache")
+    args = parser.parse_args(argv)
+
+    from h008b.session_server import build_shared_grading
+    out = args.out or os.path.join(args.data_folder, "regrade")
+    os.makedirs(out, exist_ok=True)
+    paths = sorted(p for pattern in (args.pattern or DEFAULT_PATTERNS)
+                   for p in glob.glob(os.path.join(args.data_folder, pattern)))
+    if not paths:
+        print(f"No data files found in {args.data_folder}")
+        return 1
+    prompt_template = GRADING_PROMPT_TEMPLATE
+    if args.prompt_file:
+        with open(args.prompt_file, encoding="utf-8") as f:
+            prompt_template = f.read()
+
+    base_url = args.base_url
+    if args.mock:
+        from h008b.mock_server import start_in_thread
+        _, base_url = start_in_thread(port=0)
+    grading_worker = build_shared_grading(args.model, out, args.workers, base_url,
+                                          local_grading=not args.no_local_grading,
+                                          cache=not args.no_cache, structured=args.structured,
+                                          cheap_model=args.cheap_model, audit_rate=0.0)
+    question_info = {"H008b": dict_of_question_info, "H008a": {}}
+    if os.path.exists(H008A_SCRIPT):
+        question_info["H008a"] = load_script_questions(H008A_SCRIPT)
+
+    checkpoint = Checkpoint(os.path.join(out, "regrade_checkpoint.jsonl"), args.resume)
+    regrader = Regrader(grading_worker, question_info, prompt_template,
+                        max_in_flight=args.workers * 4)
+    started, done = time(), [0]
+    def progress():
+        done[0] += 1
+        if done[0] % 100 == 0:
+            print(f"  {done[0]} rows regraded ({done[0] / (time() - started):.1f}/s)")
+    print(f"Regrading {len(paths)} file(s) into {out}")
+    try:
+        regrader.run(iter_graded_rows(paths), checkpoint, progress)
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again with --resume to continue.")
+        return 130
+    finally:
+        grading_worker.shutdown()
+        checkpoint.close()
+
+    summary = write_comparison(checkpoint.done.values(), os.path.join(out, "regrade_comparison.csv"))
+    elapsed = time() - started
+    regraded = len(checkpoint.done) - regrader.skipped["resumed"]
+    print(f"Regraded {regraded} row(s) in {elapsed:.1f} s"
+          + (f" ({regrader.skipped['resumed']} from the checkpoint)" if regrader.skipped["resumed"] else ""))
+    for reason, count in regrader.skipped.items():
+        if reason != "resumed":
+            print(f"  skipped {count} row(s): {reason}")
+    rows = summary["rows"] or 1
+    print(f"Accuracy changed on {summary['accuracy_changed']} of {summary['rows']} rows "
+          f"({100 * summary['accuracy_changed'] / rows:.1f}%), "
+          f"grade changed on {summary['grade_changed']} ({100 * summary['grade_changed'] / rows:.1f}%)")
+    for transition, count in sorted(summary.items()):
+        if "->" in transition:
+            print(f"  {transition}: {count}")
+    print(f"Comparison table: {os.path.join(out, 'regrade_comparison.csv')}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
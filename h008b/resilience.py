@@ -0,0 +1,272 @@
+"""
+Timeouts, retries and a circuit breaker for the grading model.
+
+A bare chat.completions.create() call has no deadline of its own here: a
+slow response keeps the participant on "Checking solution..." indefinitely,
+and a 429/5xx throws straight into the runner's session-ending error
+handler. ResilientEvaluator wraps an evaluator (OpenAIEvaluator,
+StructuredEvaluator, BatchingEvaluator, ...) and gives every grade
+
+    - a hard deadline: the whole call, retries included, is given up on
+      after `deadline` seconds (each attempt is also capped at `timeout`),
+    - jittered exponential retries for timeouts, connection errors, 429s
+      and 5xx responses (Retry-After is honoured within the deadline),
+    - a circuit breaker: after `breaker_threshold` grades in a row fail,
+      calls fail fast for `breaker_cooldown` seconds, then one trial call
+      decides whether to close it again.
+
+When a grade can't be had, GradingUnavailable is raised; ResponseGrader
+turns that into a local-matcher grade or an "experimenter review" verdict
+so the session carries on. Counters are written to a JSON metrics file.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from random import Random
+from time import monotonic, sleep, time
+
+# Errors worth another try; anything else (bad request, auth, malformed
+# replies that were already re-asked) fails the grade straight away
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "RateLimitError",
+                   "InternalServerError"}
+
+
+class GradingUnavailable(RuntimeError):
+    """No grade could be had in time (retries used up or circuit open)."""
+
+
+def error_kind(error):
+    """'timeout', 'rate_limited', 'server_error', 'connection' or 'other'."""
+    status = getattr(error, "status_code", None)
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or name == "APITimeoutError" or status == 408:
+        return "timeout"
+    if status == 429 or name == "RateLimitError":
+        return "rate_limited"
+    if (status or 0) >= 500 or name == "InternalServerError":
+        return "server_error"
+    if isinstance(error, ConnectionError) or name == "APIConnectionError":
+        return "connection"
+    return "other"
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    return (error_kind(error) != "other" or status in RETRYABLE_STATUS
+            or type(error).__name__ in RETRYABLE_NAMES)
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header on the error's response, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """closed -> (threshold failures in a row) -> open -> (cooldown) -> half-open."""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        """May a call go out now? In half-open, only one trial call at a time."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Returns True if this failure (re)opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            was_trial, self._trial_running = self._trial_running, False
+            if was_trial or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = monotonic()
+                return True
+            return False
+
+
+class ResilientEvaluator:
+    """Deadline + retries + circuit breaker around an evaluator."""
+
+    def __init__(self, evaluator, timeout=20.0, deadline=45.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, breaker_threshold=5,
+                 breaker_cooldown=30.0, metrics_path=None, metrics_interval=1.0,
+                 max_concurrency=8, seed=None):
+        self.evaluator = evaluator
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval # min seconds between routine writes
+        self.stream = getattr(evaluator, "stream", False)
+        self.reports_usage = getattr(evaluator, "reports_usage", False)
+        self.metrics = {"calls": 0, "successes": 0, "attempts": 0, "retries": 0,
+                        "timeouts": 0, "rate_limited": 0, "server_errors": 0,
+                        "connection_errors": 0, "other_errors": 0,
+                        "unavailable": 0, "short_circuited": 0, "breaker_opened": 0,
+                        "max_latency": 0.0}
+        self._rng = Random(seed)
+        self._lock = threading.Lock()
+        self._last_write = None # monotonic() of the last metrics write
+        self._write_lock = threading.Lock() # One metrics write at a time
+        # Attempts run here so a hung request can be walked away from at the
+        # deadline (it finishes, or times out in the client, in the background)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="grading-call")
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def backoff(self, attempt, error):
+        delay = self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        hinted = retry_after(error)
+        return max(delay, hinted) if hinted is not None else delay
+
+    def __call__(self, prompt, user_solution, on_delta=None, **options):
+        # Intervals are timed on the monotonic clock, so a clock step (NTP,
+        # a manual change) can't stretch or cut short the deadline
+        started = monotonic()
+        give_up_at = started + self.deadline
+        self.count("calls")
+        if not self.breaker.allow():
+            self.count("short_circuited")
+            return self._unavailable("circuit open, grading model skipped", started)
+
+        # A streamed reply that broke off halfway can't be retried cleanly,
+        # and an abandoned attempt must not keep writing into the stream
+        streamed, current = [], [None]
+        def relay(attempt):
+            def on_attempt_delta(delta):
+                if current[0] == attempt:
+                    streamed.append(delta)
+                    on_delta(delta)
+            return on_attempt_delta
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = give_up_at - monotonic()
+            if remaining <= 0:
+                break
+            if attempt:
+                self.count("retries")
+            self.count("attempts")
+            current[0] = attempt
+            kwargs = dict(options, on_delta=relay(attempt)) if on_delta is not None else options
+            future = self._pool.submit(self.evaluator, prompt, user_solution, **kwargs)
+            try:
+                evaluation = future.result(timeout=min(self.timeout, remaining))
+            except FutureTimeout:
+                future.cancel()
+                error = TimeoutError(f"no reply within {min(self.timeout, remaining):.1f} s")
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                self.count("successes")
+                self._finish(started)
+                return evaluation
+            kind = error_kind(error)
+            self.count({"timeout": "timeouts", "rate_limited": "rate_limited",
+                        "server_error": "server_errors", "connection": "connection_errors",
+                        "other": "other_errors"}[kind])
+            if not is_retryable(error) or streamed:
+                break
+            pause = self.backoff(attempt, error)
+            if monotonic() + pause >= give_up_at:
+                break
+            sleep(pause)
+
+        current[0] = None
+        if self.breaker.record_failure():
+            self.count("breaker_opened")
+        return self._unavailable(f"{type(error).__name__}: {error}" if error else
+                                 f"deadline of {self.deadline:.0f} s reached", started)
+
+    def _unavailable(self, reason, started):
+        self.count("unavailable")
+        self._finish(started, force_write=True)
+        raise GradingUnavailable(reason)
+
+    def _finish(self, started, force_write=False):
+        latency = monotonic() - started
+        with self._lock:
+            self.metrics["max_latency"] = round(max(self.metrics["max_latency"], latency), 3)
+            due = (force_write or self._last_write is None
+                   or monotonic() - self._last_write >= self.metrics_interval)
+        if due:
+            self.write_metrics()
+
+    def snapshot(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics["breaker_state"] = self.breaker.state
+        metrics["written_at"] = round(time(), 3)
+        return metrics
+
+    def write_metrics(self):
+        """Write the counters to metrics_path (atomically; no-op without a path)."""
+        if not self.metrics_path:
+            return
+        with self._lock:
+            self._last_write = monotonic()
+        # Grading threads write one at a time, each through its own temp
+        # file (other processes may share the data folder)
+        with self._write_lock:
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.metrics_path) or ".",
+                                                 prefix=os.path.basename(self.metrics_path) + ".",
+                                                 suffix=".tmp", delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(self.snapshot(), f, indent=2)
+                os.replace(tmp_path, self.metrics_path)
+            except Exception: # Metrics are best-effort; never let them end a session
+                if tmp_path is not None:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+    def close(self):
+        self.write_metrics()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,184 @@
+"""
+Tiered model routing.
+
+Most responses are easy to grade: clearly right, or clearly nonsense. Only
+the borderline ones need the big model. RoutingEvaluator asks a small,
+fast model first and only escalates to the full model when
+
+    - the small model gave a borderline grade (3 or 4 by default),
+    - it wasn't sure of itself (token-probability confidence below
+      `min_confidence`, when the tier reports one), or
+    - it failed or replied in an unusable format.
+
+Clear-cut answers the local matcher can decide never get here at all (see
+ResponseGrader). A small `audit_rate` of clear-cut answers is escalated
+anyway so the two tiers' agreement can be tracked. Audits run on their own
+GradingWorker: the cheap grade goes back to the participant straight away,
+and the full model's grade and the agreement are filled in (and counted in
+`stats`) when the audit finishes.
+
+Each grade's route -- tier used, each tier's grade, latency and cost, and
+whether they agreed -- goes into a RouteRecord that Session writes to the
+trial's data row.
+"""
+
+import threading
+from random import Random
+from time import time
+
+from h008b.async_grading import GradingWorker
+
+# USD per million (input, output) tokens; keep in line with current pricing
+MODEL_PRICES = {
+    "gpt-4.1":      (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "o3-mini":      (1.10, 4.40),
+    }
+
+
+def verdict_of(evaluation):
+    """'yes', the 1-4 grade as a string, or None if it can't be read."""
+    if not evaluation:
+        return None
+    if evaluation.strip().lower() == "yes":
+        return "yes"
+    return evaluation[-1] if evaluation[-1] in "1234" else None
+
+
+def token_cost(model, info, prices=MODEL_PRICES):
+    """Cost in USD of one reply, or None if the model or usage is unknown."""
+    price = prices.get(model)
+    if price is None or info is None or info.get("prompt_tokens") is None:
+        return None
+    return round((info["prompt_tokens"] * price[0]
+                  + (info.get("completion_tokens") or 0) * price[1]) / 1e6, 6)
+
+
+class RouteRecord:
+    """Where one grade came from; filled in by RoutingEvaluator."""
+
+    def __init__(self):
+        self.tier = None # "local", "cheap" or "full"
+        self.cheap = {}  # grade, latency, cost, confidence
+        self.full = {}
+        self.agreement = None # True/False when both tiers graded it
+
+    def columns(self):
+        """Values for the trial data row (see engine.DATA_HEADER)."""
+        def value(tier, key):
+            v = tier.get(key)
+            return "NA" if v is None else v
+        agreement = "NA" if self.agreement is None else ("yes" if self.agreement else "no")
+        return [self.tier or "NA",
+                value(self.cheap, "grade"), value(self.cheap, "latency"), value(self.cheap, "cost"),
+                value(self.full, "grade"), value(self.full, "latency"), value(self.full, "cost"),
+                agreement]
+
+
+class RoutingEvaluator:
+    """Small model first, full model for borderline or uncertain answers."""
+
+    routes = True # ResponseGrader hands us a RouteRecord
+    stream = False # Which tier answers isn't known until the small one has
+
+    def __init__(self, cheap, full, cheap_model, full_model, escalate_grades=("3", "4"),
+                 min_confidence=0.8, audit_rate=0.0, prices=MODEL_PRICES, seed=None,
+                 audit_workers=1):
+        self.cheap = cheap
+        self.full = full
+        self.cheap_model = cheap_model
+        self.full_model = full_model
+        self.escalate_grades = set(escalate_grades)
+        self.min_confidence = min_confidence
+        self.audit_rate = audit_rate
+        self.prices = prices
+        self.stats = {"calls": 0, "cheap_only": 0, "escalated": 0, "audited": 0,
+                      "compared": 0, "agreed": 0, "cost": 0.0}
+        self._rng = Random(seed)
+        self._lock = threading.Lock()
+        self._audits = GradingWorker(self._audit, max_workers=audit_workers)
+
+    def _ask(self, evaluator, model, prompt, user_solution, record):
+        replies = []
+        kwargs = {"on_reply": replies.append} if getattr(evaluator, "reports_usage", False) else {}
+        started = time()
+        try:
+            evaluation = evaluator(prompt, user_solution, **kwargs)
+        finally:
+            record["latency"] = round(time() - started, 3)
+        info = replies[-1] if replies else None
+        record["grade"] = verdict_of(evaluation) or "unreadable"
+        record["cost"] = token_cost(model, info, self.prices)
+        record["confidence"] = info and info.get("confidence")
+        if record["cost"] is not None:
+            with self._lock:
+                self.stats["cost"] = round(self.stats["cost"] + record["cost"], 6)
+        return evaluation
+
+    def needs_full_model(self, evaluation, record):
+        verdict = verdict_of(evaluation)
+        if verdict is None or verdict in self.escalate_grades:
+            return True
+        confidence = record.get("confidence")
+        return confidence is not None and confidence < self.min_confidence
+
+    def __call__(self, prompt, user_solution, route=None):
+        route = route if route is not None else RouteRecord()
+        with self._lock:
+            self.stats["calls"] += 1
+            audit = self.audit_rate > 0 and self._rng.random() < self.audit_rate
+        try:
+            evaluation = self._ask(self.cheap, self.cheap_model, prompt, user_solution, route.cheap)
+        except Exception:
+            route.cheap["grade"] = "error"
+            evaluation = None
+        if evaluation is not None and not self.needs_full_model(evaluation, route.cheap):
+            if not audit:
+                route.tier = "cheap"
+                with self._lock:
+                    self.stats["cheap_only"] += 1
+                return evaluation
+            with self._lock:
+                self.stats["audited"] += 1
+            # Audited: the full model grades it too, in the background; the
+            # cheap grade stands and isn't held up
+            route.tier = "cheap"
+            self._audits.submit(prompt, user_solution, route)
+            return evaluation
+
+        with self._lock:
+            self.stats["escalated"] += 1
+        route.tier = "full"
+        try:
+            full_evaluation = self._ask(self.full, self.full_model, prompt, user_solution, route.full)
+        except Exception:
+            if evaluation is None or verdict_of(evaluation) is None:
+                raise
+            # Full model unavailable; a borderline grade beats none
+            route.full["grade"], route.tier = "error", "cheap"
+            return evaluation
+        self._compare(route)
+        return full_evaluation
+
+    def _audit(self, prompt, user_solution, route):
+        full = {}
+        try:
+            self._ask(self.full, self.full_model, prompt, user_solution, full)
+        except Exception:
+            full["grade"] = "error"
+        route.full = full
+        self._compare(route)
+
+    def _compare(self, route):
+        cheap, full = route.cheap.get("grade"), route.full.get("grade")
+        if cheap in (None, "error", "unreadable") or full in (None, "error", "unreadable"):
+            return
+        route.agreement = cheap == full
+        with self._lock:
+            self.stats["compared"] += 1
+            self.stats["agreed"] += route.agreement
+
+    def close(self, wait=True):
+        """Stop the audit worker (by default after the audits in progress)."""
+        self._audits.shutdown(wait=wait)
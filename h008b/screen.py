@@ -0,0 +1,146 @@
+"""
+In-process terminal rendering.
+
+The runner used to clear the screen with os.system('clear'/'cls') -- a
+shell fork/exec on every answer loop and survey retry -- and called
+shutil.get_terminal_size() for every centred line. Screen writes ANSI
+escapes instead, keeps the terminal size until the terminal is resized
+(SIGWINCH), and remembers the last frame it drew. render() only rewrites
+the lines that changed: on a retry of the same question the header box and
+question text stay put, and only the points line and what follows are
+redrawn.
+
+Frames are lists of lines (strings may contain newlines); anything printed
+after a frame -- the prompt, the typed answer, "Checking solution..." --
+is cleared by the next render(). Callers that print more than SCRATCH_ROWS
+rows below a frame (which can scroll it) call invalidate(), so the next
+render() draws from scratch. When stdout isn't a terminal, frames are just
+printed one after another.
+"""
+
+import os
+import shutil
+import signal
+import sys
+import threading
+
+CLEAR = "\x1b[H\x1b[2J\x1b[3J" # Home, clear screen, clear scrollback
+CLEAR_BELOW = "\x1b[J"
+CLEAR_LINE = "\x1b[2K"
+# Rows kept free below a frame for the prompt, answer and grading lines;
+# incremental redraws assume nothing scrolled the frame out of place
+SCRATCH_ROWS = 8
+
+
+def _move(row):
+    return f"\x1b[{row};1H"
+
+
+def _enable_ansi(stream):
+    """True if `stream` is a terminal that understands ANSI escapes."""
+    try:
+        if not stream.isatty():
+            return False
+    except (AttributeError, ValueError):
+        return False
+    if os.name != "nt":
+        return os.environ.get("TERM") != "dumb"
+    try: # Windows 10+: switch on VT processing for this console
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11) # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except (AttributeError, OSError):
+        return False
+
+
+class Screen:
+    """Draws whole-screen frames, rewriting only what changed."""
+
+    def __init__(self, stream=None, ansi=None, size=None):
+        self.stream = stream or sys.stdout
+        self.ansi = _enable_ansi(self.stream) if ansi is None else ansi
+        self._fixed_size = size is not None # (columns, lines) given, for tests/benchmarks
+        self._size = os.terminal_size(size) if size is not None else None
+        self._frame = None      # Lines drawn by the last render(), if still on screen
+        self.stats = {"full": 0, "partial": 0, "lines_written": 0}
+        if (hasattr(signal, "SIGWINCH") and self.ansi
+                and threading.current_thread() is threading.main_thread()):
+            previous = signal.getsignal(signal.SIGWINCH)
+            def resized(signum, frame):
+                self._frame = None
+                if not self._fixed_size:
+                    self._size = None
+                if callable(previous):
+                    previous(signum, frame)
+            signal.signal(signal.SIGWINCH, resized)
+
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = shutil.get_terminal_size()
+        return self._size
+
+    @property
+    def columns(self):
+        return self.size.columns
+
+    def center(self, text):
+        """`text` padded to sit in the middle of the terminal."""
+        return " " * ((self.columns - len(text)) // 2) + text
+
+    def divider(self, char="_"):
+        return char * self.columns
+
+    def _write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+
+    def invalidate(self):
+        """Forget the last frame; the next render() redraws the whole screen."""
+        self._frame = None
+
+    def clear(self):
+        """Blank screen (next render() draws from scratch)."""
+        self._frame = None
+        if not self._fixed_size and os.name == "nt":
+            self._size = None # No SIGWINCH on Windows; re-read the size here
+        self._write(CLEAR if self.ansi else "\n")
+
+    def _rows(self, line):
+        return max(1, -(-len(line) // self.columns))
+
+    def render(self, lines):
+        """Show `lines` as the whole screen, cursor on the line below them."""
+        lines = [part for line in lines for part in str(line).split("\n")]
+        if not self.ansi:
+            self._write("\n" + "\n".join(lines) + "\n")
+            return
+        previous, self._frame = self._frame, lines
+        if (previous is None
+                or sum(map(self._rows, lines)) + SCRATCH_ROWS > self.size.lines):
+            self.stats["full"] += 1
+            self.stats["lines_written"] += len(lines)
+            self._write(CLEAR + "\n".join(lines) + "\n")
+            return
+        self.stats["partial"] += 1
+        out, row = [], 1
+        for i, line in enumerate(lines):
+            rows = self._rows(line)
+            if i >= len(previous) or self._rows(previous[i]) != rows:
+                # Layout shifts from here on; redraw the rest
+                out.append(_move(row) + CLEAR_BELOW + "\n".join(lines[i:]) + "\n")
+                self.stats["lines_written"] += len(lines) - i
+                break
+            if line != previous[i]:
+                out.append("".join(_move(row + r) + CLEAR_LINE for r in range(rows))
+                           + _move(row) + line)
+                self.stats["lines_written"] += 1
+            row += rows
+        else:
+            # Same layout: drop whatever was printed below the frame
+            out.append(_move(row) + CLEAR_BELOW)
+        self._write("".join(out))
@@ -0,0 +1,375 @@
+"""
+Multi-station session server.
+
+Hosts many participant sessions in one process instead of one runner per
+lab station. Each connection is a small state machine built from the
+runner's main loop (setup -> question -> pass/correct/survey -> ...), and
+all stations share
+
+    - one OpenAI client (one pooled HTTP connection pool),
+    - one grading cache and one local grader,
+    - one bounded grading worker pool, and
+    - one data sink thread writing every session's .csv.
+
+Stations are thin line-based terminal clients: `python -m
+h008b.station_client HOST PORT`, or plain `nc HOST PORT` / `telnet HOST
+PORT`. Each station still gets its own data/H008b_output_data_*.csv.
+
+Usage:
+    python -m h008b.session_server --port 8765 --grading-workers 16
+    python -m h008b.session_server --mock           # offline, built-in mock grader
+"""
+
+import argparse
+import asyncio
+import os
+import string
+from datetime import datetime
+
+from h008b.async_grading import GradingWorker
+from h008b.batching import BatchingEvaluator
+from h008b.columnar import available as columnar_available
+from h008b.connection_pool import ConnectionPool
+from h008b.data_writer import DataSink
+from h008b.engine import Session, DATA_HEADER, skip_cost, correct_reward
+from h008b.grading import ResponseGrader, OpenAIEvaluator
+from h008b.grading_cache import GradingCache
+from h008b.local_grading import LocalGrader
+from h008b.ordering import subject_number
+from h008b.resilience import ResilientEvaluator
+from h008b.routing import RoutingEvaluator
+from h008b.structured_grading import StructuredEvaluator
+from h008b.questions import (dict_of_question_info, dict_of_question_banks,
+                             dict_of_local_grading_rules, catalog)
+
+CLEAR = "\x1b[2J\x1b[H" # ANSI clear screen + cursor home
+WIDTH = 80 # Stations are assumed to be at least 80 columns wide
+
+SURVEY_TAE = "On a scale of 1-5, how much did you rely on trial-and-error thinking to reach your answer? (1 = very little, 5 = a great deal): "
+SURVEY_AHA = "On a scale of 1-5, to what extent did you experience an 'aha' moment when solving this question? (1 = very little, 5 = a great deal): "
+
+
+def center_text(text):
+    return " " * ((WIDTH - len(text)) // 2) + text
+
+
+class Station:
+    """One connected station; feeds participant lines into a Session."""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+        self.peer = writer.get_extra_info("peername")
+
+    async def send(self, text):
+        self.writer.write(text.encode("utf-8"))
+        await self.writer.drain()
+
+    async def ask(self, prompt):
+        await self.send(prompt)
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionResetError("station disconnected")
+        return line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def header(self):
+        s = self.session
+        return (CLEAR + f" Question {s.current_question_number}/{s.num_questions}\n"
+                + center_text("╭──────────────────────────────────────────────╮") + "\n"
+                + center_text("│            Problem-Solving Experiment        │") + "\n"
+                + center_text("╰──────────────────────────────────────────────╯") + "\n"
+                + center_text(f"Earned points: {s.earned_points}\n\n") + "\n")
+
+    async def run(self):
+        try:
+            if await self.setup():
+                await self.run_session()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass # Station went away; the data file is closed below
+        except Exception as e:
+            await self.send(CLEAR + "\nERROR DURING SESSION -- please notify experimenter\n"
+                            f"Error type: {type(e).__name__}\nMessage: {e}\n")
+        finally:
+            if self.session is not None:
+                self.session.close()
+            self.server.stations.discard(self)
+            self.writer.close()
+
+    async def setup(self):
+        # Setup screen
+        await self.send(CLEAR + center_text("EXPERIMENTER SETUP") + "\n")
+        subject_ID = await self.ask("\nInput subject ID (then hit 'enter'): ")
+        ABA_condition = (await self.ask("Input 'A' or 'B' condition (then hit 'enter'): ")).upper()
+        question_bank_num = await self.ask(f"Input question bank number {catalog.bank_choices()} (then hit 'enter'): ")
+        await self.send(CLEAR + center_text("EXPERIMENTER SETUP") + "\n")
+        await self.send(f"\nSubject ID : {subject_ID}\nABA Condition: {ABA_condition}\nQuestion Bank: {question_bank_num}\n\n")
+        await self.ask("Hit 'enter' to start experimental session.")
+        if question_bank_num not in dict_of_question_banks:
+            await self.ask(f"ERROR: Question bank number should be one of {', '.join(dict_of_question_banks)}. Restart and try again.")
+            return False
+        self.session = self.server.new_session(subject_ID, ABA_condition, question_bank_num)
+        return True
+
+    async def run_session(self):
+        session = self.session
+        while session.next_question() is not None:
+            if not await self.run_question():
+                return # quit
+        if session.finished: # Stopped by the session timer
+            await self.send("\nTime max reached\n")
+        warning = await self.close_session()
+        await self.send("SESSION COMPLETE\n" + warning)
+        await self.ask(f"\n- Data file written to {session.data_writer.file_loc}\n")
+
+    async def close_session(self):
+        """Close the session; returns a warning if its data file wasn't written in full."""
+        self.session.close()
+        # The .csv handle, also under a TeeDataWriter (--columnar-folder)
+        writer = getattr(self.session.data_writer, "primary", self.session.data_writer)
+        try:
+            await asyncio.to_thread(writer.flush)
+        except Exception as e:
+            return ("\nWARNING: the data file was not fully written -- please notify experimenter\n"
+                    f"Error type: {type(e).__name__}\nMessage: {e}\n")
+        return ""
+
+    async def run_question(self):
+        session = self.session
+        prev_outcome = None
+        while True:
+            await self.send(self.header()
+                            + "\nPlease provide a solution to the following problem:\n\n"
+                            + session.current_question["insight_question"] + "\n"
+                            + "_" * WIDTH + "\n\n")
+            if prev_outcome is not None:
+                user_response = await self.ask(f"{prev_outcome.feedback}.\nYou've earned {prev_outcome.points} points for your guess. Try again (or type 'pass' to skip for -{skip_cost} points): ")
+            else:
+                user_response = await self.ask(f"Enter your solution (or 'pass' to skip for -{skip_cost} points): ")
+
+            if user_response == "quit":
+                warning = await self.close_session()
+                await self.send(CLEAR + "\nThank you for participating!\nSESSION COMPLETE\n" + warning)
+                return False
+            elif user_response.lower() == "pass":
+                await self.send(f"\nPassing this question means you can come back later, but will cost {skip_cost} points.\n")
+                possible_pass = await self.ask("Are you sure you want to pass this question? ('yes' or 'no'): ")
+                if possible_pass.lower() == "yes":
+                    session.pass_question(user_response)
+                    await self.ask("\nQuestion passed.\nHit enter to continue...")
+                    return True
+                prev_outcome = None
+                continue
+
+            await self.send(center_text("Checking solution...") + "\n")
+            job = session.begin_response(user_response)
+            await asyncio.wrap_future(job.future)
+            outcome = session.finish_response(job)
+            if outcome.accuracy == "Correct":
+                await self.ask(f"\nCorrect! You've found a solution and earned +{correct_reward} points.\nHit enter to continue...")
+                await self.survey()
+                return True
+            prev_outcome = outcome
+
+    async def survey(self):
+        while True:
+            await self.send(self.header() + "\n\n\nPROBLEM-SOLVING SURVEY\n")
+            responses = []
+            for question in (SURVEY_TAE, SURVEY_AHA):
+                resp = await self.ask(question)
+                try:
+                    resp = int(resp)
+                    if not 1 <= resp <= 5:
+                        raise ValueError
+                except ValueError:
+                    await self.ask("Error: response must be an integer between 1 and 5. Hit enter and try again")
+                    break
+                responses.append(resp)
+            if len(responses) == 2:
+                self.session.record_survey(*responses)
+                return
+
+
+class SessionServer:
+    """Shared grading/data resources plus the set of connected stations."""
+
+    def __init__(self, grading_worker, data_sink, data_folder="data", session_minutes=30,
+                 columnar_folder=None, order_seed=None):
+        self.grading_worker = grading_worker
+        self.data_sink = data_sink
+        self.data_folder = data_folder
+        self.session_minutes = session_minutes
+        self.columnar_folder = columnar_folder
+        self.order_seed = order_seed # Question orders are counterbalanced by subject number
+        self.stations = set()
+        self._file_ids = set()
+
+    def new_session(self, subject_ID, ABA_condition, question_bank_num):
+        # Sessions started in the same second would share a timestamp, so
+        # open the file ourselves with a de-duplicated name
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        file_id, n = timestamp, 1
+        while file_id in self._file_ids:
+            n += 1
+            file_id = f"{timestamp}_{n}"
+        self._file_ids.add(file_id)
+        safe_subject = "".join(c for c in subject_ID if c in string.ascii_letters + string.digits + "-_")
+        file_loc = os.path.join(self.data_folder, f"H008b_output_data_{file_id}_{safe_subject or 'NA'}.csv")
+        writer = self.data_sink.open_session(file_loc, DATA_HEADER)
+        return Session(subject_ID, ABA_condition, question_bank_num, self.grading_worker,
+                       data_writer=writer, session_minutes=self.session_minutes,
+                       columnar_folder=self.columnar_folder,
+                       order_number=subject_number(subject_ID), order_seed=self.order_seed)
+
+    async def handle(self, reader, writer):
+        station = Station(self, reader, writer)
+        self.stations.add(station)
+        await station.run()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        addresses = ", ".join(str(s.getsockname()[:2]) for s in server.sockets)
+        print(f"H008b session server listening on {addresses} (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+
+
+def build_shared_grading(model, data_folder, grading_workers, base_url=None,
+                         local_grading=True, cache=True, batch_window=0.05, batch_size=8,
+                         grading_deadline=60.0, structured=False, request_timeout=20.0,
+                         cheap_model=None, audit_rate=0.05, connection_pool=None):
+    """One client, one cache, one local grader, one worker pool for all stations.
+
+    With batch_window > 0, GPT requests from different stations that arrive
+    within the window are coalesced per question (see h008b/batching.py).
+    structured=True grades with JSON replies (h008b/structured_grading.py);
+    those are still coalesced, but sent one answer per request. Every grade
+    is retried/timed out/short-circuited by ResilientEvaluator, with
+    `grading_deadline` as its hard ceiling. With a cheap_model, grades are
+    routed through it first (see h008b/routing.py). A connection_pool starts
+    warming up in the background as soon as the client is built, and is
+    kept alive while idle (see h008b/connection_pool.py).
+    """
+    from openai import OpenAI # Only needed when the server actually grades with GPT
+    # Retries are done by ResilientEvaluator, not inside the client
+    options = {"timeout": request_timeout, "max_retries": 0}
+    if connection_pool is not None:
+        options["http_client"] = connection_pool.http_client()
+    if base_url:
+        client = OpenAI(base_url=base_url, api_key=os.environ.get("OPENAI_API_KEY", "local-mock"),
+                        **options)
+    else:
+        client = OpenAI(**options)
+    if connection_pool is not None:
+        connection_pool.warm(f"{client.base_url}models", client.api_key) # Returns at once
+    fallback_grader = LocalGrader(dict_of_question_info, dict_of_local_grading_rules)
+    local_grader = fallback_grader if local_grading else None
+    grading_cache = GradingCache(os.path.join(data_folder, "H008b_grading_cache.sqlite")) if cache else None
+    def tier(model, metrics_name, logprobs=False):
+        if structured:
+            evaluator = StructuredEvaluator(client, model)
+        else:
+            evaluator = OpenAIEvaluator(client, model, logprobs=logprobs)
+        if batch_window > 0:
+            evaluator = BatchingEvaluator(evaluator, window=batch_window, max_batch=batch_size,
+                                          max_concurrency=grading_workers,
+                                          deadline=grading_deadline)
+        return ResilientEvaluator(evaluator, timeout=request_timeout, deadline=grading_deadline,
+                                  max_concurrency=grading_workers,
+                                  metrics_path=os.path.join(data_folder, metrics_name))
+
+    evaluator = tier(model, "H008b_grading_metrics.json")
+    cache_model = model
+    if cheap_model:
+        evaluator = RoutingEvaluator(tier(cheap_model, "H008b_grading_metrics_cheap.json",
+                                          logprobs=True),
+                                     evaluator, cheap_model, model, audit_rate=audit_rate)
+        cache_model = f"{cheap_model}>{model}"
+    grader = ResponseGrader(evaluator, cache_model, local_grader=local_grader, cache=grading_cache,
+                            fallback_grader=fallback_grader)
+    return GradingWorker(grader, background=True, max_workers=grading_workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many H008b stations in one process.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default="gpt-4.1")
+    parser.add_argument("--base-url", default=os.environ.get("H008B_GPT_BASE_URL"),
+                        help="OpenAI-compatible server to grade against")
+    parser.add_argument("--mock", action="store_true",
+                        help="start the built-in mock grading server and use it")
+    parser.add_argument("--grading-workers", type=int, default=16,
+                        help="max grading requests in flight at once (default 16)")
+    parser.add_argument("--batch-window-ms", type=float, default=50,
+                        help="coalesce GPT requests arriving within this window; 0 = off (default 50)")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="max answers per multi-answer GPT request (default 8)")
+    parser.add_argument("--grading-deadline", type=float, default=60,
+                        help="seconds before a pending grade is given up on and left for "
+                             "experimenter review (default 60)")
+    parser.add_argument("--request-timeout", type=float, default=20,
+                        help="seconds per GPT request before it is retried (default 20)")
+    parser.add_argument("--structured", action="store_true",
+                        help="ask for JSON verdict/grade/hint replies instead of free text")
+    parser.add_argument("--cheap-model", default=None,
+                        help="grade with this model first and escalate borderline answers "
+                             "to --model (e.g. gpt-4.1-mini)")
+    parser.add_argument("--audit-rate", type=float, default=0.05,
+                        help="share of clear-cut cheap-model grades also sent to --model")
+    parser.add_argument("--data-folder", default=os.path.join(os.getcwd(), "data"))
+    parser.add_argument("--session-minutes", type=float, default=30)
+    parser.add_argument("--columnar-folder", default=None,
+                        help="also write each session as typed Parquet, partitioned by "
+                             "subject/condition/bank, under this folder (needs pyarrow)")
+    parser.add_argument("--order-seed", default="H008b",
+                        help="seed for counterbalancing question orders across subject "
+                             "numbers (the trailing digits of the subject ID)")
+    parser.add_argument("--keepalive-interval", type=float, default=30,
+                        help="seconds idle before the GPT connections are pinged to keep "
+                             "them open; 0 = don't pre-warm or ping (default 30)")
+    args = parser.parse_args(argv)
+    if args.columnar_folder and not columnar_available():
+        parser.error("--columnar-folder needs pyarrow (pip install pyarrow)")
+
+    base_url = args.base_url
+    if args.mock:
+        from h008b.mock_server import start_in_thread
+        _, base_url = start_in_thread(port=0)
+    os.makedirs(args.data_folder, exist_ok=True)
+    connection_pool = None
+    if args.keepalive_interval > 0:
+        connection_pool = ConnectionPool(max_connections=args.grading_workers,
+                                         keepalive_interval=args.keepalive_interval)
+    grading_worker = build_shared_grading(args.model, args.data_folder,
+                                          args.grading_workers, base_url,
+                                          batch_window=args.batch_window_ms / 1000,
+                                          batch_size=args.batch_size,
+                                          grading_deadline=args.grading_deadline,
+                                          structured=args.structured,
+                                          request_timeout=args.request_timeout,
+                                          cheap_model=args.cheap_model,
+                                          audit_rate=args.audit_rate,
+                                          connection_pool=connection_pool)
+    data_sink = DataSink()
+    server = SessionServer(grading_worker, data_sink, args.data_folder, args.session_minutes,
+                           args.columnar_folder, args.order_seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        grading_worker.shutdown()
+        try:
+            data_sink.close()
+        except Exception as e:
+            print(f"WARNING: data not fully written ({type(e).__name__}: {e}); "
+                  "see the stations' end-of-session messages")
+        if connection_pool is not None:
+            print("GPT connections: " + connection_pool.summary())
+            connection_pool.close()
+
+
+if __name__ == "__main__":
+    main()
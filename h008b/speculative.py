@@ -0,0 +1,125 @@
+"""
+Speculative grading of drafts.
+
+With blocking input() grading can only start once the participant hits
+enter. When the front-end can see keystrokes (h008b/raw_input.py), it can
+hand the current draft to SpeculativeGrader whenever typing pauses; the
+draft is graded in the background on a worker of its own, so real
+submissions never queue behind a speculation. If the participant then
+submits exactly a draft that was speculated, Session.begin_response()
+reuses that grade -- for short answers it's usually in before enter is hit.
+
+Speculation is bounded: at most `max_per_question` drafts per question, at
+least `min_interval` seconds apart, one in flight at a time (a newer draft
+waits in a single slot and replaces any older waiting one).
+"""
+
+import threading
+from time import time
+
+from h008b.async_grading import GradingJob
+from h008b.routing import RouteRecord
+from h008b.streaming import FeedbackStream
+
+
+class SpeculativeGrader:
+    """Grades drafts ahead of submission and hands matching grades back."""
+
+    def __init__(self, grading_worker, max_per_question=6, min_interval=0.5):
+        self.grading_worker = grading_worker
+        self.max_per_question = max_per_question
+        self.min_interval = min_interval
+        self.stats = {"drafts": 0, "sent": 0, "reused": 0, "wasted": 0,
+                      "duplicates": 0, "rate_limited": 0, "superseded": 0}
+        self._jobs = {}          # draft -> GradingJob, for the current question
+        self._question = None
+        self._sent_for_question = 0
+        self._last_sent = 0.0
+        self._in_flight = None
+        self._waiting = None     # (prompt, shorthand, draft) sent when the slot frees up
+        self._lock = threading.RLock() # Done-callbacks may run inline in _send()
+
+    @staticmethod
+    def key(draft):
+        return draft.strip()
+
+    def speculate(self, prompt, shorthand, draft):
+        """Offer a draft for grading; returns True if it was sent or queued."""
+        draft = self.key(draft)
+        if not draft or draft.lower() in ("pass", "quit"):
+            return False
+        with self._lock:
+            self.stats["drafts"] += 1
+            if shorthand != self._question:
+                self._reset(shorthand)
+            if draft in self._jobs or (self._waiting and self._waiting[2] == draft):
+                self.stats["duplicates"] += 1
+                return False
+            if (self._sent_for_question >= self.max_per_question
+                    or time() - self._last_sent < self.min_interval):
+                self.stats["rate_limited"] += 1
+                return False
+            if self._in_flight is not None and not self._in_flight.done():
+                if self._waiting is not None:
+                    self.stats["superseded"] += 1
+                self._waiting = (prompt, shorthand, draft)
+                return True
+            self._send(prompt, shorthand, draft)
+            return True
+
+    def _send(self, prompt, shorthand, draft):
+        # Called with the lock held
+        # Same stream/route records as a real submission, so a claimed grade
+        # can show its hint as it streams and log its model tiers
+        stream, route = FeedbackStream(), RouteRecord()
+        job = self.grading_worker.submit(prompt, shorthand, draft, stream=stream, route=route)
+        stream.started_ns = job.submitted_ns
+        job.stream, job.route = stream, route
+        self._jobs[draft] = job
+        self._in_flight = job
+        self._sent_for_question += 1
+        self._last_sent = time()
+        self.stats["sent"] += 1
+        job.future.add_done_callback(lambda _: self._send_waiting(shorthand))
+
+    def _send_waiting(self, shorthand):
+        with self._lock:
+            if self._waiting is None or self._question != shorthand:
+                return
+            prompt, shorthand, draft = self._waiting
+            self._waiting = None
+            if self._sent_for_question < self.max_per_question:
+                self._send(prompt, shorthand, draft)
+            else:
+                self.stats["rate_limited"] += 1
+
+    def claim(self, shorthand, response):
+        """GradingJob for a submitted response if its draft was speculated, else None."""
+        with self._lock:
+            if shorthand != self._question:
+                return None
+            draft = self.key(response)
+            source = self._jobs.pop(draft, None)
+            if source is None:
+                if self._waiting is not None and self._waiting[2] == draft:
+                    self._waiting = None # Being graded for real now
+                return None
+            self.stats["reused"] += 1
+        return GradingJob.follow(source)
+
+    def reset(self, shorthand=None):
+        """Forget speculations (unclaimed ones count as wasted)."""
+        with self._lock:
+            self._reset(shorthand)
+
+    def _reset(self, shorthand):
+        self.stats["wasted"] += len(self._jobs)
+        self._jobs = {}
+        self._waiting = None
+        self._question = shorthand
+        self._sent_for_question = 0
+
+    def summary(self):
+        s = self.stats
+        return (f"Speculative grades: {s['sent']} sent, {s['reused']} reused, "
+                f"{s['wasted']} unused, {s['rate_limited']} skipped (rate limit)")
@@ -0,0 +1,52 @@
+"""
+Thin terminal client for h008b.session_server.
+
+Shows whatever the server sends and sends back each line the participant
+types. All session logic, grading and data writing happen on the server.
+
+Usage:
+    python -m h008b.station_client SERVER_HOST [PORT]
+"""
+
+import socket
+import sys
+import threading
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: python -m h008b.station_client SERVER_HOST [PORT]")
+        return 2
+    host = argv[0]
+    port = int(argv[1]) if len(argv) > 1 else 8765
+    sock = socket.create_connection((host, port))
+
+    def show_server_output():
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            sys.stdout.write(data.decode("utf-8", errors="replace"))
+            sys.stdout.flush()
+        print("\n[Connection to session server closed]")
+
+    reader = threading.Thread(target=show_server_output, daemon=True)
+    reader.start()
+    try:
+        for line in sys.stdin:
+            sock.sendall(line.encode("utf-8"))
+    except (KeyboardInterrupt, OSError):
+        pass
+    finally:
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        reader.join(timeout=2)
+        sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Streamed grading feedback.
+
+With a streaming evaluator the model's reply arrives a few tokens at a
+time. FeedbackStream collects those pieces (on the grading thread) and lets
+the front-end, polling from its own thread, show the hint as it is being
+written instead of after the whole completion is in.
+
+It also works out the verdict as early as it can: a reply that can no
+longer be a bare "yes" is feedback for an incorrect answer, so the hint can
+start showing from the first token or two. The trailing 1-4 grade is held
+back from the visible text, and trailing punctuation is trimmed the way
+the session trims it. Once the reply is complete, split_evaluation (the
+session's own parse) settles the verdict and the hint. Time to first token
+and time to verdict are recorded for the data file.
+"""
+
+import string
+import threading
+
+from h008b.grading import split_evaluation
+from h008b.timing import now_ns, ns_seconds
+
+# Characters held back from the visible hint while streaming, so the
+# trailing " <grade>" never flashes up on screen
+HOLD_BACK = 3
+
+
+class FeedbackStream:
+    """Accumulates a streamed evaluation and tracks when things happened."""
+
+    def __init__(self, started_ns=None):
+        self.started_ns = now_ns() if started_ns is None else started_ns
+        self.first_token_ns = None
+        self.verdict = None         # None (undecided), "Correct", "Incorrect" or "Review"
+        self.verdict_ns = None
+        self._parts = []
+        self._hint = None           # The hint as the session records it, once finished
+        self._lock = threading.Lock()
+
+    def feed(self, delta):
+        """Add a piece of the reply (called from the grading thread)."""
+        if not delta:
+            return
+        with self._lock:
+            if self.first_token_ns is None:
+                self.first_token_ns = now_ns()
+            self._parts.append(delta)
+            if self.verdict is None:
+                self._decide("".join(self._parts))
+
+    def finish(self, evaluation):
+        """Record the complete reply; its verdict and hint are the session's."""
+        accuracy, _, hint = split_evaluation(evaluation)
+        with self._lock:
+            if accuracy != self.verdict:
+                self.verdict, self.verdict_ns = accuracy, now_ns()
+            if accuracy == "Incorrect":
+                self._hint = hint
+
+    def _decide(self, text):
+        # Only a bare "yes" is correct, so anything that isn't (the start
+        # of) one is a hint; "yes" with more after it waits for finish()
+        head = text.lstrip().lower()
+        if not "yes".startswith(head[:3]):
+            self.verdict = "Incorrect"
+            self.verdict_ns = now_ns()
+
+    @property
+    def text(self):
+        with self._lock:
+            return "".join(self._parts)
+
+    def visible_hint(self):
+        """Hint text that is safe to show so far ('' until it's known to be a hint)."""
+        with self._lock:
+            if self.verdict != "Incorrect":
+                return ""
+            if self._hint is not None:
+                return self._hint
+            text = "".join(self._parts).lstrip()
+        return text[:max(0, len(text) - HOLD_BACK)].rstrip(string.punctuation + string.whitespace)
+
+    def time_to_first_token(self):
+        if self.first_token_ns is None:
+            return "NA"
+        return ns_seconds(self.first_token_ns - self.started_ns)
+
+    def time_to_verdict(self):
+        if self.verdict_ns is None or self.first_token_ns is None:
+            return "NA"
+        return ns_seconds(self.verdict_ns - self.started_ns)
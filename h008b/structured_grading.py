@@ -0,0 +1,151 @@
+"""
+Structured (JSON) grading.
+
+The free-text evaluation ("yes", or feedback ending in a 1-4 grade) is
+parsed by position: the grade is the last character and the feedback is
+everything before it. When the model drifts from that format (a trailing
+period, "Grade: 3", a grade in the middle) the parse fails and takes the
+session down with it.
+
+StructuredEvaluator asks for a JSON object instead
+
+    {"verdict": "correct" | "incorrect", "grade": 1-4 | null, "hint": "..."}
+
+(using the API's strict JSON-schema response format where available),
+checks it with validate_evaluation(), and re-asks only when the reply is
+malformed, at most `max_attempts` times in total. A valid reply is turned
+back into the usual evaluation string, so the cache, the data file and
+Session.finish_response() don't change.
+"""
+
+import json
+import threading
+
+from h008b.grading import solution_message
+
+VERDICTS = ("correct", "incorrect")
+
+# JSON schema for the reply; sent as the strict response format
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": list(VERDICTS)},
+        "grade": {"type": ["integer", "null"], "enum": [1, 2, 3, 4, None]},
+        "hint": {"type": "string"},
+        },
+    "required": ["verdict", "grade", "hint"],
+    "additionalProperties": False,
+    }
+
+# Appended to the grading prompt; overrides its "end with a number" instruction
+STRUCTURED_INSTRUCTIONS = """
+Instead of a plain-text reply, always reply with a single JSON object and
+nothing else, with exactly these keys:
+  "verdict": "correct" if the solution is close enough to the correct answer
+             (where you would otherwise reply 'yes'), else "incorrect"
+  "grade": for an incorrect solution, the 1-4 grade described above as an
+           integer; null for a correct solution
+  "hint": for an incorrect solution, your sentence of feedback (without the
+          grade); "" for a correct solution"""
+
+
+class MalformedEvaluation(ValueError):
+    """A structured reply that doesn't match EVALUATION_SCHEMA."""
+
+
+def validate_evaluation(reply):
+    """Check a parsed JSON reply; returns the evaluation string.
+
+    "yes" for a correct verdict, otherwise "<hint> <grade>" -- the same
+    format the free-text prompt asks for. Raises MalformedEvaluation.
+    """
+    if not isinstance(reply, dict):
+        raise MalformedEvaluation("reply is not a JSON object")
+    verdict = reply.get("verdict")
+    if verdict not in VERDICTS:
+        raise MalformedEvaluation(f"verdict must be one of {VERDICTS}, got {verdict!r}")
+    if verdict == "correct":
+        return "yes"
+    grade = reply.get("grade")
+    if type(grade) is not int or not 1 <= grade <= 4:
+        raise MalformedEvaluation(f"grade must be an integer 1-4, got {grade!r}")
+    hint = reply.get("hint")
+    if not isinstance(hint, str) or not hint.strip():
+        raise MalformedEvaluation("hint must be a non-empty string")
+    return f"{' '.join(hint.split())} {grade}"
+
+
+def parse_structured_reply(text):
+    """JSON text (optionally in a ``` fence) -> evaluation string."""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        reply = json.loads(text)
+    except ValueError as e:
+        raise MalformedEvaluation(f"reply is not valid JSON ({e})") from None
+    return validate_evaluation(reply)
+
+
+class StructuredEvaluator:
+    """Grades one response with a JSON reply, re-asking when it's malformed.
+
+    Drop-in for OpenAIEvaluator (same call signature and return value). A
+    malformed reply is sent back with the validation error for another go;
+    MalformedEvaluation is raised once `max_attempts` replies have failed.
+    Set strict_schema=False for servers without json_schema response formats
+    (the instructions in the prompt still ask for JSON).
+    """
+
+    stream = False # Replies are only usable once complete
+
+    def __init__(self, client, model, max_attempts=3, strict_schema=True):
+        self.client = client
+        self.model = model
+        self.max_attempts = max_attempts
+        self.strict_schema = strict_schema
+        self.stats = {"calls": 0, "requests": 0, "retries": 0, "malformed": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def response_format(self):
+        if not self.strict_schema:
+            return {"type": "json_object"}
+        return {"type": "json_schema",
+                "json_schema": {"name": "insight_evaluation", "strict": True,
+                                "schema": EVALUATION_SCHEMA}}
+
+    def __call__(self, prompt, user_solution):
+        messages = [
+            {"role": "system", "content": prompt + "\n" + STRUCTURED_INSTRUCTIONS},
+            {"role": "user", "content": solution_message(user_solution)}
+            ]
+        self.count("calls")
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.count("retries")
+            self.count("requests")
+            completion = self.client.chat.completions.create(
+                model= self.model,
+                messages= messages,
+                response_format= self.response_format()
+                )
+            content = completion.choices[0].message.content or ""
+            try:
+                return parse_structured_reply(content)
+            except MalformedEvaluation as e:
+                self.count("malformed")
+                error = e
+            # Only the malformed call is re-asked, with what was wrong with it
+            messages = messages[:2] + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": f"That reply was not valid: {error}. "
+                                            "Reply again with only the JSON object."}
+                ]
+        self.count("failed")
+        raise MalformedEvaluation(f"No valid evaluation after {self.max_attempts} attempts: {error}")
@@ -0,0 +1,58 @@
+"""
+Trial timing on one monotonic clock.
+
+The timers used to mix datetime.now() deltas with time(). Both are wall
+clocks that jump with NTP adjustments, and they were read wherever the
+code happened to be, so screen clearing and the grading call leaked into
+them. Every timer now reads time.perf_counter_ns(), a monotonic,
+high-resolution clock.
+
+The moments that matter are stamped for each response:
+
+    prompt_shown     the question/retry prompt is on screen
+    first_key        the participant's first keystroke (raw key input only)
+    submitted        enter was hit
+    grade_received   the grade came back from the grader
+    feedback_shown   "Correct!", the hint or the review notice is on screen
+
+Session writes them as integer nanoseconds since the start of the session
+(PromptShownNs ... FeedbackShownNs). A reaction time such as
+SubmittedNs - PromptShownNs therefore covers only the participant: drawing
+the screen and waiting on the grader fall outside it.
+"""
+
+from datetime import timedelta
+from time import perf_counter_ns
+
+now_ns = perf_counter_ns
+
+EVENTS = ("prompt_shown", "first_key", "submitted", "grade_received", "feedback_shown")
+EVENT_COLUMNS = ["PromptShownNs", "FirstKeyNs", "SubmittedNs", "GradeReceivedNs", "FeedbackShownNs"]
+
+
+def ns_timedelta(ns):
+    return timedelta(microseconds=ns // 1000)
+
+
+def ns_seconds(ns, digits=3):
+    return round(ns / 1e9, digits)
+
+
+class TrialEvents:
+    """perf_counter_ns() stamps of the events of one response."""
+
+    def __init__(self):
+        self.times = dict.fromkeys(EVENTS)
+
+    def mark(self, event, ns=None):
+        """Stamp `event` (now, by default) unless it already is; returns the stamp."""
+        if self.times[event] is None:
+            self.times[event] = now_ns() if ns is None else ns
+        return self.times[event]
+
+    def get(self, event):
+        return self.times[event]
+
+    def columns(self, origin_ns):
+        """Values for EVENT_COLUMNS: ns since `origin_ns`, or "NA"."""
+        return ["NA" if self.times[e] is None else self.times[e] - origin_ns for e in EVENTS]
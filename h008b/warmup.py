@@ -0,0 +1,80 @@
+"""
+Deferred, pre-warmed API client.
+
+The runner used to import openai (and with it httpx and pydantic) and
+build its client before the experimenter setup screen came up. That
+slowed every launch, and a missing API key stopped the script before
+anything was shown.
+
+LazyClient stands in for the client. It builds the real one with `factory`
+the first time an attribute is used, e.g. client.chat.completions.create().
+warm() builds it on a background thread instead, so the import is usually
+done by the time the experimenter has typed in the subject ID, condition
+and bank. If the build fails, every later use raises ClientUnavailable.
+ResilientEvaluator treats that like any other failed GPT call: the
+fallback grader decides, or the response is logged for review. The
+session carries on either way.
+
+    client = LazyClient(lambda: OpenAI(timeout=20, max_retries=0))
+    client.warm()                      # returns at once
+    ...
+    evaluator = OpenAIEvaluator(client, "gpt-4.1")
+"""
+
+import threading
+from time import perf_counter
+
+
+class ClientUnavailable(RuntimeError):
+    """The client couldn't be built (openai missing, no API key, ...)."""
+
+
+class LazyClient:
+    """A client built on first use, or ahead of time by warm()."""
+
+    def __init__(self, factory, name="client"):
+        self._factory = factory
+        self._name = name
+        self._lock = threading.Lock()
+        self._client = None
+        self.error = None         # Why the build failed, if it did
+        self.build_seconds = None # How long the import + construction took
+        self.ready = threading.Event() # Set once the build has finished (or failed)
+
+    def get(self):
+        """The real client, building it now if nobody has yet."""
+        if not self.ready.is_set():
+            with self._lock:
+                if not self.ready.is_set():
+                    started = perf_counter()
+                    try:
+                        self._client = self._factory()
+                    except Exception as e:
+                        self.error = e
+                    finally:
+                        self.build_seconds = perf_counter() - started
+                        self.ready.set()
+        if self.error is not None:
+            raise ClientUnavailable(f"{self._name} unavailable: {self.error}") from self.error
+        return self._client
+
+    def __getattr__(self, name):
+        if name.startswith("_"): # Not ours to forward (copy, pickle, ...)
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def warm(self):
+        """Build the client on a daemon thread; returns the thread."""
+        thread = threading.Thread(target=self._warm, name=f"{self._name}-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm(self):
+        try:
+            self.get()
+        except ClientUnavailable:
+            pass # Kept in self.error; reported when the client is used
+
+    def wait(self, timeout=None):
+        """Wait up to `timeout` seconds for the build; True if it is done."""
+        return self.ready.wait(timeout)